@@ -0,0 +1,168 @@
+#!/usr/bin/python3
+
+"""
+Copyright (c) 2017 Wind River Systems, Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software  distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES
+OR CONDITIONS OF ANY KIND, either express or implied.
+
+
+Benchmark of the trie shaped keyword patterns compiled from the shipped keyword lists, compared
+with the alternation of the keywords grouped by their first character that they replaced. Run it
+at the root of the repo:
+
+    python3 benchmarks/benchmark_patterns.py /usr/include
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from cryptodetector import Regex
+
+METHODS_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), \
+    "cryptodetector", "methods")
+
+# name, keyword list path, and options of the Regex object of each benchmark
+BENCHMARKS = [
+    ("keyword list, ignore case", os.path.join(METHODS_DIRECTORY, "keyword", \
+        "keyword_list.txt"), {"ignore_case": True}),
+    ("keyword list, case sensitive", os.path.join(METHODS_DIRECTORY, "keyword", \
+        "keyword_list.txt"), {"ignore_case": False}),
+    ("api definitions, whole words", os.path.join(METHODS_DIRECTORY, "api", \
+        "api_definitions.txt"), {"whole_words": True})
+]
+
+def read_contents(paths, max_size):
+    """Read the UTF-8 text files under the given paths
+
+    Args:
+        paths: (list) of file and directory paths
+        max_size: (integer) number of characters after which to stop reading files
+
+    Returns:
+        (list) of file contents
+    """
+    contents = []
+    size = 0
+    file_paths = []
+    for path in paths:
+        if os.path.isfile(path):
+            file_paths.append(path)
+        for root, directories, file_names in os.walk(path):
+            directories.sort()
+            file_paths.extend(os.path.join(root, file_name) for file_name in sorted(file_names))
+
+    for file_path in file_paths:
+        if size >= max_size:
+            break
+        try:
+            with open(file_path, encoding="utf-8") as text_file:
+                content = text_file.read()
+        except (OSError, UnicodeDecodeError):
+            continue
+        contents.append(content)
+        size += len(content)
+
+    return contents
+
+def first_char_pattern(regex, language):
+    """Alternation of the keywords of a language grouped by their first character behind a
+    lookahead, in the order of the sorted keyword list. This is how keyword lists were compiled
+    before they were merged in a trie.
+
+    Args:
+        regex: (Regex) with its keyword list already read
+        language: (string) language of the keywords
+
+    Returns:
+        (SRE_Pattern)
+    """
+    first_char_groups = {}
+    for keyword, keyword_re in regex.keywords[language]:
+        first_char_groups.setdefault(keyword[:1], []).append(keyword_re)
+
+    alternatives = []
+    for first_char, keyword_res in first_char_groups.items():
+        lookahead = ""
+        if first_char:
+            lookahead = "(?=" + re.escape(first_char) + ")"
+        alternatives.append(lookahead + "(?:" + "|".join(keyword_res) + ")")
+
+    return re.compile("|".join(alternatives), flags=regex.flags)
+
+def best_time(function, repeat):
+    """Best wall clock time of several runs of a function
+
+    Args:
+        function: (function) taking no arguments
+        repeat: (integer) number of runs
+
+    Returns:
+        (tuple) the best time in seconds and the result of the last run
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+def run_benchmarks():
+    parser = argparse.ArgumentParser(description="Benchmark of the keyword patterns compiled " \
+        + "from the shipped keyword lists")
+
+    parser.add_argument("--repeat", dest="repeat", type=int, default=3, \
+        help="Number of runs of each benchmark, of which the best time is reported")
+
+    parser.add_argument("--max-size", dest="max_size", type=int, default=4 * 1024 * 1024, \
+        help="Number of characters of text after which to stop reading files")
+
+    parser.add_argument("--language", dest="language", default="c", \
+        help="Language of the keywords to search for")
+
+    parser.add_argument("paths", nargs="*", default=["/usr/include"], \
+        help="Files and directories to search")
+
+    parsed_args = vars(parser.parse_args())
+    language = parsed_args["language"]
+    repeat = parsed_args["repeat"]
+
+    contents = read_contents(parsed_args["paths"], parsed_args["max_size"])
+    print("Searching " + str(sum(len(content) for content in contents)) + " characters of " \
+        + str(len(contents)) + " files, best of " + str(repeat) + " runs")
+
+    for name, keyword_list_path, options in BENCHMARKS:
+        regex = Regex(**options)
+        regex.read_keyword_list(keyword_list_path)
+
+        alternation = first_char_pattern(regex, language)
+        alternation_time, alternation_spans = best_time(lambda: [(match.start(), match.end()) \
+            for content in contents for match in alternation.finditer(content)], repeat)
+
+        search_time, search_spans = best_time(lambda: [(match["file_index_begin"], \
+            match["file_index_end"]) for content in contents \
+            for match in regex.search(content, language)], repeat)
+
+        print("\n" + name)
+        print("    first character alternation: %.2fs, %d matches" % (alternation_time, \
+            len(alternation_spans)))
+        print("    Regex.search:                %.2fs, %d matches" % (search_time, \
+            len(search_spans)))
+        if search_spans != alternation_spans:
+            print("    the matches differ")
+
+if __name__ == '__main__':
+    run_benchmarks()
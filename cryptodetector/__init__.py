@@ -15,13 +15,18 @@ OR CONDITIONS OF ANY KIND, either express or implied.
 from os.path import dirname, realpath, join, basename, isfile
 from os import listdir
 
+from cryptodetector.version import VERSION
 from cryptodetector.logger import Logger
 from cryptodetector.language import Language
 from cryptodetector.output import Output
+from cryptodetector.line_index import LineIndex
+from cryptodetector.hit import Hit
 from cryptodetector.crypto_output import CryptoOutput
 from cryptodetector.regex import Regex
+from cryptodetector.result_cache import ResultCache
 from cryptodetector.rpm import is_rpm, extract_rpm
 from cryptodetector.filelister import FileLister
+from cryptodetector.pipeline import Pipeline, PipelineQueue
 from cryptodetector.method import Method, MethodFactory
 from cryptodetector.options import Options
 from cryptodetector.cryptodetector import CryptoDetector
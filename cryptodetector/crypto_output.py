@@ -12,11 +12,11 @@ under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES
 OR CONDITIONS OF ANY KIND, either express or implied.
 """
 
-import copy
+import json
 import hashlib
 import codecs
 
-from cryptodetector import Language
+from cryptodetector import Hit
 
 class CryptoOutput(object):
     """Class for structuring the JSON data in the crypto output"""
@@ -24,6 +24,17 @@ class CryptoOutput(object):
     # the version of the crypto specification with which this output format complies
     CRYPTO_SPEC_VERSION = 3.0
 
+    # output fields holding the text surrounding a hit, and the offset of their line relative to
+    # the line of the hit
+    LINE_TEXT_FIELDS = {
+        "line_text": 0,
+        "line_text_before_1": -1,
+        "line_text_before_2": -2,
+        "line_text_before_3": -3,
+        "line_text_after_1": 1,
+        "line_text_after_2": 2,
+        "line_text_after_3": 3
+    }
 
     def __init__(self):
         self.__JSON_data = {
@@ -37,6 +48,9 @@ class CryptoOutput(object):
             "crypto_evidence": {}
         }
 
+        # hits whose line text fields are yet to be filled, with the line index of their file
+        self.__pending_line_text = []
+
     @staticmethod
     def required_output_fields():
         """defines the output fields and what is required by a match object.
@@ -55,27 +69,7 @@ class CryptoOutput(object):
         Returns:
             (dict) key-value pair of field to a boolean indicating wether it is required.
         """
-        return {
-            "comments": False,
-            "human_reviewed": False,
-            "line_text": False,
-            "line_text_after_1": False,
-            "line_text_after_2": False,
-            "line_text_after_3": False,
-            "line_text_before_1": False,
-            "line_text_before_2": False,
-            "line_text_before_3": False,
-            "file_index_begin": True,
-            "file_index_end": True,
-            "line_index_begin": False,
-            "line_index_end": False,
-            "line_number": False,
-            "matched_text": True,
-            "evidence_type": True,
-            "detection_method": True,
-            "encryption_api_usage": False,
-            "encryption_library": False
-        }
+        return dict(Hit.FIELDS)
 
     def set_package_name(self, package_name):
         """Set the package name
@@ -105,13 +99,41 @@ class CryptoOutput(object):
         verif_code = hashlib.sha1(codecs.encode(joined_sha1s, "utf-8")).hexdigest()
         self.__JSON_data["file_collection_verification_code"] = verif_code
 
-    def add_hit(self, file_path, file_sha1, file_language, hit):
+    def add_hit(self, file_path, file_sha1, file_language, hit, line_index=None):
         """Adds a hit in the file with the given SHA1 and path
 
+        Line text fields missing from the hit are filled by fill_line_text, or when the crypto
+        data is requested, from the line index of the file if the hit has a line number,
+        otherwise they are left blank. The line index and its content are kept until then.
+
         Args:
             file_path: (string)
             file_sha1: (string)
-            hit: (dict)
+            file_language: language of the file (see langauges.py)
+            hit: (Hit) or the dict of its output fields
+            line_index: (LineIndex) of the file content, or None if it is not at hand
+
+        Returns
+            None
+        """
+        self.add_file_path(file_path, file_sha1, file_language)
+
+        if not isinstance(hit, Hit):
+            hit = Hit(**hit)
+
+        if hit.line_text is None:
+            self.__pending_line_text.append((hit, line_index))
+
+        self.__JSON_data["crypto_evidence"][file_sha1]["hits"].append(hit)
+
+    def add_file_path(self, file_path, file_sha1, file_language):
+        """Adds the path of a file with the given SHA1, without adding any hits. The hits of a
+        file with the same content are only added once, along with the path of the first file.
+
+        Args:
+            file_path: (string)
+            file_sha1: (string)
+            file_language: language of the file (see langauges.py)
 
         Returns
             None
@@ -130,7 +152,54 @@ class CryptoOutput(object):
                 file_language.is_source_code:
                 self.__JSON_data["crypto_evidence"][file_sha1]["is_source_code"] = True
 
-        self.__JSON_data["crypto_evidence"][file_sha1]["hits"].append(copy.copy(hit))
+    def fill_line_text(self):
+        """Fill the line text fields of the hits added since the last call
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        CryptoOutput.fill_hits_line_text(self.__pending_line_text)
+        self.__pending_line_text = []
+
+    @staticmethod
+    def fill_hits_line_text(pending_hits):
+        """Fill the line text fields missing from the given hits
+
+        Args:
+            pending_hits: (list) of (Hit, LineIndex) tuples, where the line index is the one of
+                the file content of the hit, or None to leave its line text fields blank. They
+                are left blank as well if the hit has no line number.
+
+        Returns:
+            None
+        """
+        # hits of the same file are added one after another, and the ones on the same or nearby
+        # lines share the same line text strings
+        line_texts = {}
+        last_line_index = None
+
+        for hit, line_index in pending_hits:
+            if not isinstance(hit.line_number, int):
+                line_index = None
+            if line_index is not last_line_index:
+                line_texts = {}
+                last_line_index = line_index
+
+            for field, line_offset in CryptoOutput.LINE_TEXT_FIELDS.items():
+                if getattr(hit, field) is not None:
+                    continue
+                if line_index is None:
+                    setattr(hit, field, "")
+                    continue
+                line_number = hit.line_number + line_offset
+                line_text = line_texts.get(line_number)
+                if line_text is None:
+                    line_text = line_index.line_text(line_number)
+                    line_texts[line_number] = line_text
+                setattr(hit, field, line_text)
 
     def get_crypto_data(self):
         """Return the JSON data
@@ -139,6 +208,37 @@ class CryptoOutput(object):
             None
 
         Returns:
-            (string) JSON formatted data
+            (dict) JSON data, where the hits are Hit objects (see CryptoOutput.to_json)
         """
+        self.fill_line_text()
         return self.__JSON_data
+
+    @staticmethod
+    def hits_to_dicts(json_data):
+        """Convert the hits of the JSON data to the dicts of their output fields, in place
+
+        Args:
+            json_data: (dict) as returned by get_crypto_data
+
+        Returns:
+            (dict) the same json_data, where the hits are dicts
+        """
+        for evidence in json_data["crypto_evidence"].values():
+            evidence["hits"] = [hit.to_dict() if isinstance(hit, Hit) else hit \
+                for hit in evidence["hits"]]
+        return json_data
+
+    @staticmethod
+    def to_json(json_data, pretty=False):
+        """Serialize the JSON data, converting each Hit to a dict only as it is written
+
+        Args:
+            json_data: (dict) as returned by get_crypto_data
+            pretty: (bool) whether to sort the keys and indent the output
+
+        Returns:
+            (string) JSON formatted data
+        """
+        if pretty:
+            return json.dumps(json_data, sort_keys=True, indent=2, default=Hit.to_dict)
+        return json.dumps(json_data, default=Hit.to_dict)
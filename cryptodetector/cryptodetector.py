@@ -13,17 +13,20 @@ OR CONDITIONS OF ANY KIND, either express or implied.
 """
 
 import os
+import io
 import sys
 import hashlib
 import codecs
 import mimetypes
-import json
-import copy
 import re
 import time
 import platform
+import multiprocessing
+import multiprocessing.util
+import mmap
+from collections import OrderedDict
 from cryptodetector import Method, MethodFactory, Language, Output, FileLister, Logger, \
-    CryptoOutput
+    CryptoOutput, Regex, Hit, Pipeline, ResultCache, LineIndex, VERSION
 from cryptodetector.exceptions import InvalidOptionsException, FileWriteException, \
     InvalidMethodException, FailedFileRead
 
@@ -32,7 +35,42 @@ class CryptoDetector(object):
     """Cryptography Detector main class
     """
 
-    VERSION = "0.2 development"
+    VERSION = VERSION
+
+    # encodings tried one after another to read a text file, after the encoding sniffed from
+    # its first bytes if any (see sniff_encoding)
+    TEXT_ENCODINGS = ["utf-8", "latin-1", "iso-8859-1", "utf-16", "utf-32", "cp500"]
+
+    # byte order marks of UTF-16 and UTF-32 text, the UTF-32 ones first since the little endian
+    # one starts with the UTF-16 one. A UTF-8 byte order mark is left to the utf-8 encoding,
+    # which keeps it in the text.
+    BYTE_ORDER_MARKS = [(codecs.BOM_UTF32_LE, "utf-32"), (codecs.BOM_UTF32_BE, "utf-32"), \
+        (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16")]
+
+    # number of bytes at the beginning of a file in which to look for the null bytes of UTF-16
+    # and UTF-32 text that has no byte order mark
+    ENCODING_SNIFF_SIZE = 4096
+
+    # size of the buffer with which binary files are hashed without being read into memory
+    HASH_BUFFER_SIZE = 1024 * 1024
+
+    # number of the most recently searched contents whose hits are remembered for the rest of
+    # the run; see remember_scanned_content
+    SCANNED_CONTENTS_LIMIT = 4096
+
+    # bytes a memory-mapped text file may not have, so that its content is the same as its
+    # decoded text: anything that is not ASCII, and carriage returns which reading the file as
+    # text would translate
+    UNMAPPABLE_TEXT_REGEX = re.compile(rb"[^\x00-\x0c\x0e-\x7f]")
+
+    # bytes of ASCII text; see is_ascii_text
+    ASCII_BYTES = bytes(range(0x80))
+
+    # bytes of text files, and the other characters of UTF-16 and UTF-32 text files; see
+    # has_nontext_characters
+    TEXT_BYTES = bytes([7, 8, 9, 10, 11, 12, 13, 27]) + bytes(range(0x20, 0x7f)) \
+        + bytes(range(0x80, 0x100))
+    NONTEXT_CHARACTERS_REGEX = re.compile("[\x00-\x06\x0e-\x1a\x1c-\x1f\x7f]")
 
 
     def __init__(self, options, skip_output=False):
@@ -50,13 +88,22 @@ class CryptoDetector(object):
         """
         try:
             for option in ["output", "quick", "output_in_package_directory", "output_existing", \
-                "pretty", "log", "source_files_only"]:
+                "pretty", "log", "source_files_only", "cache_directory", "pipeline", \
+                "search_duplicate_contents"]:
                 setattr(self, option, options[option])
             self.output_directory = self.output
             Method.ignore_evidence_types = options["ignore_evidence_types"]
+            Regex.cache_directory = self.cache_directory
             Output.verbose = options["verbose"]
             Output.suppress_warnings = options["suppress_warnings"]
             stop_after = options["stop_after"]
+            jobs = options["jobs"]
+            package_jobs = options["package_jobs"]
+            stream_chunk_size = options["stream_chunk_size"]
+            result_cache = options["result_cache"]
+            stat_cache = options["stat_cache"]
+            mmap_threshold = options["mmap_threshold"]
+            text_check_size = options["text_check_size"]
             packages = options["packages"]
             methods = options["methods"]
         except KeyError as expn:
@@ -77,6 +124,80 @@ class CryptoDetector(object):
             if self.stop_after < 1:
                 raise InvalidOptionsException("stop_after should be a positive integer.")
 
+        try:
+            self.jobs = int(jobs)
+        except (TypeError, ValueError):
+            raise InvalidOptionsException("Invalid jobs value: '" + str(jobs) + "'.")
+        if self.jobs < 1:
+            raise InvalidOptionsException("jobs should be a positive integer.")
+
+        try:
+            self.package_jobs = int(package_jobs)
+        except (TypeError, ValueError):
+            raise InvalidOptionsException("Invalid package_jobs value: '" + str(package_jobs) \
+                + "'.")
+        if self.package_jobs < 1:
+            raise InvalidOptionsException("package_jobs should be a positive integer.")
+
+        # files larger than the chunk size are streamed in chunks of that many bytes; see
+        # search_file_in_chunks
+        self.stream_chunk_size = None
+        if stream_chunk_size:
+            try:
+                self.stream_chunk_size = int(stream_chunk_size) * 1024
+            except (TypeError, ValueError):
+                raise InvalidOptionsException("Invalid stream_chunk_size value: '" \
+                    + str(stream_chunk_size) + "'.")
+            if self.stream_chunk_size < 1:
+                raise InvalidOptionsException("stream_chunk_size should be a positive integer.")
+
+        # ASCII text files at least this many bytes large are memory-mapped instead of read; see
+        # map_text_file
+        self.mmap_threshold = None
+        if mmap_threshold:
+            try:
+                self.mmap_threshold = int(mmap_threshold) * 1024
+            except (TypeError, ValueError):
+                raise InvalidOptionsException("Invalid mmap_threshold value: '" \
+                    + str(mmap_threshold) + "'.")
+            if self.mmap_threshold < 1:
+                raise InvalidOptionsException("mmap_threshold should be a positive integer.")
+
+        # number of bytes at the beginning of a file of unknown language that tell whether it is
+        # a text file; see has_nontext_characters
+        try:
+            self.text_check_size = int(text_check_size) * 1024
+        except (TypeError, ValueError):
+            raise InvalidOptionsException("Invalid text_check_size value: '" \
+                + str(text_check_size) + "'.")
+        if self.text_check_size < 1:
+            raise InvalidOptionsException("text_check_size should be a positive integer.")
+
+        # hits of each content cached between runs; see search_content
+        self.result_cache = None
+        if result_cache:
+            if not self.cache_directory:
+                raise InvalidOptionsException("result_cache requires a cache_directory.")
+            self.result_cache = ResultCache(self.cache_directory)
+
+        # local files whose metadata did not change since they were cached are not read; see
+        # load_cached_file
+        self.stat_cache = bool(stat_cache)
+        if self.stat_cache and self.result_cache is None:
+            raise InvalidOptionsException("stat_cache requires result_cache.")
+
+        # worker processes scanning files and packages when there is more than one job; see
+        # scan_files and scan_package_paths
+        self.pool = None
+        self.package_pool = None
+
+        # threads scanning the files of a package when there is a single job; see scan_files
+        self.file_pipeline = None
+
+        # content key -> whether the content found matches and its hits, for the contents
+        # searched most recently in this run, oldest first; see search_file
+        self.scanned_contents = OrderedDict()
+
         if not os.path.isdir(self.output_directory):
             raise InvalidOptionsException("The specified output directory doesn't exist: " \
                 + self.output_directory)
@@ -126,6 +247,19 @@ class CryptoDetector(object):
 
             self.active_methods[method] = method_instances[method]
 
+        # length of the longest match of any active method, or None if it is not bounded; see
+        # search_text_file_in_chunks
+        match_lengths = [method.max_match_length() for method in self.active_methods.values()]
+        self.max_match_length = None
+        if None not in match_lengths:
+            self.max_match_length = max(match_lengths, default=0)
+
+        # everything the SHA1, language and size of a local file depend on other than the file
+        # itself: the version of the program, and how binary files are told apart and read.
+        # The stat cache only uses the files cached with the same settings; see load_cached_file
+        self.file_cache_settings = repr((VERSION, self.text_check_size, \
+            self.searches_binary_files()))
+
     def scan(self):
         """Main function to initiate the scanning job
 
@@ -133,7 +267,8 @@ class CryptoDetector(object):
             None
 
         Returns:
-            None
+            (dict) package name -> whether it found matches in quick mode, otherwise its crypto
+                data (see CryptoOutput.get_crypto_data) with the hits as dicts
         """
         if not self.packages:
             return
@@ -167,141 +302,26 @@ class CryptoDetector(object):
         total_file_count = 0
         total_lines_of_text = 0
 
-        for package_path in self.packages:
-            package_filelist = self.file_lister.get_package_filelist(package_path)
-
-            for package in package_filelist:
-                package_name = package["package_name"]
-                package_root = package["package_root"]
-                file_list = package["file_list"]
-                sha1_list = []
-                package_count += 1
-                match_count = 0
-                checksums = {}
-                crypto_output = CryptoOutput()
-
-                self.current_package = package_name
-                self.package_text_bytes = 0
-                self.package_binary_bytes = 0
-                self.package_lines_of_text = 0
-
-                crypto_output.set_package_name(package_name)
-
-                Output.print_information("Scanning package " + package_name + "\n")
-
-                start_time = time.time()
-                stats = {}
-                self.package_text_bytes = 0
-                self.package_binary_bytes = 0
-                self.package_lines_of_text = 0
-
-                if self.quick and package_name not in self.quick_scan_result:
-                    self.quick_scan_result[package_name] = False
-
-                for file_path in file_list:
-                    content, language = self.read_file(file_path["physical_path"])
+        # each match of a wild-card address is scanned on its own, so that they can be scanned
+        # concurrently and their temporary files are cleaned up as soon as they are scanned
+        package_paths = FileLister.expand_wild_cards(self.packages)
 
-                    if content is None:
-                        raise FailedFileRead("Failed to open the file '" + file_path["display_path"] \
-                            + "' to read its contents. Please run the scan with --log and open the log" \
-                            + " file for details of this error.")
+        for package_path_result in self.scan_package_paths(package_paths):
+            Logger.events += package_path_result.get("events", "")
+            Logger.errors += package_path_result.get("errors", "")
 
-                    if isinstance(content, str):
-                        encoded_content = codecs.encode(content, "utf-8")
-                    else:
-                        encoded_content = content
-
-                    hexdigest = hashlib.sha1(encoded_content).hexdigest()
-                    sha1_list.append(hexdigest)
-
-                    found_matches = False
-
-                    for method_id in self.active_methods:
-                        method = self.active_methods[method_id]
-
-                        if not method.supports_scanning_file(language):
-                            continue
-
-                        if self.source_files_only and not language.is_source_code:
-                            continue
-
-                        Output.print_information("[" + method.method_id \
-                            + "] Scanning file " + file_path["display_path"])
-
-
-                        if self.quick:
-                            if method.quick_search(content, language):
-                                found_matches = True
-                                break
-                        else:
-                            result = method.search(content, language)
-
-                            if not result:
-                                continue
-                            else:
-                                found_matches = True
-
-                            if file_path["display_path"] not in checksums:
-                                checksums[file_path["display_path"]] = hexdigest
-
-                            for match in result:
-                                match["detection_method"] = method_id
-                                match = self.validate_match_fields(method_id, match)
-                                crypto_output.add_hit(
-                                    file_path=file_path["display_path"],
-                                    file_sha1=checksums[file_path["display_path"]],
-                                    file_language=language,
-                                    hit=match)
-                                match_count += 1
-
-                    if self.quick:
-                        if found_matches:
-                            self.quick_scan_result[package_name] = True
-                            break
-                    else:
-                        self.full_scan_result[package_name] = crypto_output.get_crypto_data()
-
-                    if self.stop_after and found_matches:
-                        if self.stop_after == 1:
-                            break
-                        else:
-                            self.stop_after -= 1
-
-                crypto_output.set_verif_code(sha1_list)
-
-                stats["execution_time"] = time.time() - start_time
-                stats["file_count"] = len(file_list)
-                stats["package_text_bytes"] = self.package_text_bytes
-                stats["package_binary_bytes"] = self.package_binary_bytes
-                stats["package_lines_of_text"] = self.package_lines_of_text
+            for package_result in package_path_result["packages"]:
+                package_name = package_result["package_name"]
+                stats = package_result["stats"]
+                package_count += 1
 
-                if package_root != None and self.output_in_package_directory:
-                    output_directory = package_root
+                if self.quick:
+                    self.quick_scan_result[package_name] = package_result["found_matches"] \
+                        or self.quick_scan_result.get(package_name, False)
                 else:
-                    output_directory = self.output_directory
-
-                # write the output to a file
-
-                if not self.skip_output and not self.quick:
-                    self.write_crypto_file(crypto_output.get_crypto_data(),
-                                           output_directory, package_name)
-
-                number_of_matches = "Did not find any matches"
-                if match_count == 1:
-                    number_of_matches = "Found only one match"
-                elif match_count > 1:
-                    number_of_matches = "Found " + str(match_count) + " matches"
-
-                Logger.log("")
-                Logger.log("Finished scanning package " + package_name + " in " \
-                    + str(round(stats["execution_time"], 2)) + " seconds.")
-                Logger.log("There were " + str(stats["file_count"]) + " files consisting of " \
-                    + str(stats["package_lines_of_text"]) + " lines of text in " \
-                    + CryptoDetector.human_readable_filesize(stats["package_text_bytes"]) \
-                    + " of text data and " \
-                    + CryptoDetector.human_readable_filesize(stats["package_binary_bytes"]) \
-                    + " of binary data.")
-                Logger.log(number_of_matches + " in " + package_name)
+                    # the hits are Hit objects only while the package is scanned and written
+                    self.full_scan_result[package_name] = CryptoOutput.hits_to_dicts( \
+                        package_result["crypto_data"])
 
                 total_execution_time += stats["execution_time"]
                 total_file_count += stats["file_count"]
@@ -309,8 +329,10 @@ class CryptoDetector(object):
                 total_binary_bytes += stats["package_binary_bytes"]
                 total_lines_of_text += stats["package_lines_of_text"]
 
-                Output.print_information("\nCleaning up temporary files ...")
-                self.file_lister.cleanup_tmp_folder()
+        self.close_pool(wait=True)
+        self.close_package_pool()
+        if self.result_cache is not None:
+            self.result_cache.close()
 
         # write quick scan output to stdout and some output file
 
@@ -356,33 +378,994 @@ class CryptoDetector(object):
         else:
             return self.full_scan_result
 
-    def validate_match_fields(self, method_id, match_dict):
-        """Validate the output fields of the match. If something is missing (but not required), it
-        will be added to the match object. If the field is required, InvalidMethodException will be
-        thrown
+    def scan_package_paths(self, package_paths):
+        """Scan the packages at the given paths, several of them at a time if there is more
+        than one package job
+
+        Args:
+            package_paths: (list) of package paths; see FileLister.get_package_filelist
+
+        Returns:
+            (iterator) of dicts with the results of the "packages" at each path (see
+                scan_package), in the order of package_paths. When scanned by another process,
+                they also have the "events" and "errors" it logged.
+        """
+        if self.package_jobs == 1 or len(package_paths) < 2:
+            return ({"packages": self.scan_package_path(package_path)} \
+                for package_path in package_paths)
+
+        self.package_pool = multiprocessing.Pool(self.package_jobs, initializer=init_scan_worker, \
+            initargs=(self, Output.verbose, Output.suppress_warnings))
+        return self.package_pool.imap(scan_package_path_in_worker, package_paths)
+
+    def close_package_pool(self):
+        """Stop the worker processes scanning packages, if they have been started
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        if self.package_pool is not None:
+            self.package_pool.close()
+            self.package_pool.join()
+            self.package_pool = None
+
+    def scan_package_path(self, package_path):
+        """Scan the packages found at the given path, and write their output
+
+        Args:
+            package_path: (string) can specify a file, folder, wild-card, github, or a url
+
+        Returns:
+            (list) of the results of the packages; see scan_package
+        """
+        return [self.scan_package(package) \
+            for package in self.file_lister.get_package_filelist(package_path)]
+
+    def scan_package(self, package):
+        """Scan the files of a package, write its output and clean up its temporary files
+
+        Args:
+            package: (dict) with the package_name, package_root and file_list of the package;
+                see FileLister.get_package_filelist
+
+        Returns:
+            (dict) with the "package_name", whether it "found_matches", its "crypto_data" (None
+                in quick mode), and its "stats"
+        """
+        package_name = package["package_name"]
+        package_root = package["package_root"]
+        file_list = package["file_list"]
+        sha1_list = []
+        match_count = 0
+        found_matches_in_package = False
+        stop_after = self.stop_after
+        scanned_all_files = False
+        added_contents = set()
+        crypto_output = CryptoOutput()
+
+        self.current_package = package_name
+        crypto_output.set_package_name(package_name)
+
+        Output.print_information("Scanning package " + package_name + "\n")
+
+        start_time = time.time()
+        stats = {}
+        self.package_text_bytes = 0
+        self.package_binary_bytes = 0
+        self.package_lines_of_text = 0
+        text_encodings = {}
+        listed_file_count = 0
+
+        def count_listed_files():
+            nonlocal listed_file_count
+            for file_path in file_list:
+                listed_file_count += 1
+                yield file_path
+        listed_files = count_listed_files()
+
+        # the files are listed while they are being scanned
+        for file_result in self.scan_files(listed_files):
+            display_path = file_result["display_path"]
+            sha1_list.append(file_result["sha1"])
+            self.package_text_bytes += file_result["text_bytes"]
+            self.package_binary_bytes += file_result["binary_bytes"]
+            self.package_lines_of_text += file_result["lines_of_text"]
+            if file_result["encoding"] is not None:
+                text_encodings[file_result["encoding"]] = \
+                    text_encodings.get(file_result["encoding"], 0) + 1
+            found_matches = file_result["found_matches"]
+            Logger.errors += file_result.get("errors", "")
+
+            # the hits of a content are only added once, along with the first of its files
+            content_key = CryptoDetector.content_key(file_result)
+            if file_result["hits"] and content_key in added_contents:
+                crypto_output.add_file_path(display_path, file_result["sha1"], \
+                    file_result["language"])
+            elif file_result["hits"]:
+                if not self.search_duplicate_contents:
+                    added_contents.add(content_key)
+                for match in file_result["hits"]:
+                    crypto_output.add_hit(
+                        file_path=display_path,
+                        file_sha1=file_result["sha1"],
+                        file_language=file_result["language"],
+                        hit=match,
+                        line_index=file_result["line_index"])
+                    match_count += 1
+
+                # the line text is filled while the content of the file is at hand, so that it
+                # is not kept in memory until the whole package is scanned
+                crypto_output.fill_line_text()
+
+            if found_matches:
+                found_matches_in_package = True
+
+            if self.quick:
+                if found_matches:
+                    break
+
+            if stop_after and found_matches:
+                if stop_after == 1:
+                    break
+                else:
+                    stop_after -= 1
+        else:
+            scanned_all_files = True
+
+        # files scanned ahead by the workers are of no use after stopping early
+        if self.pool is not None and not scanned_all_files:
+            self.close_pool()
+
+        # the rest of the files are listed, but not read, to count all the files of the package
+        if not scanned_all_files:
+            if self.file_pipeline is not None:
+                self.file_pipeline.close()
+            for _ in listed_files:
+                pass
+
+        if self.result_cache is not None:
+            self.result_cache.flush()
+
+        crypto_output.set_verif_code(sha1_list)
+
+        stats["execution_time"] = time.time() - start_time
+        stats["file_count"] = listed_file_count
+        stats["package_text_bytes"] = self.package_text_bytes
+        stats["package_binary_bytes"] = self.package_binary_bytes
+        stats["package_lines_of_text"] = self.package_lines_of_text
+        stats["text_encodings"] = text_encodings
+
+        if package_root != None and self.output_in_package_directory:
+            output_directory = package_root
+        else:
+            output_directory = self.output_directory
+
+        # write the output to a file
+
+        if not self.skip_output and not self.quick:
+            self.write_crypto_file(crypto_output.get_crypto_data(),
+                                   output_directory, package_name)
+
+        number_of_matches = "Did not find any matches"
+        if match_count == 1:
+            number_of_matches = "Found only one match"
+        elif match_count > 1:
+            number_of_matches = "Found " + str(match_count) + " matches"
+
+        Logger.log("")
+        Logger.log("Finished scanning package " + package_name + " in " \
+            + str(round(stats["execution_time"], 2)) + " seconds.")
+        Logger.log("There were " + str(stats["file_count"]) + " files consisting of " \
+            + str(stats["package_lines_of_text"]) + " lines of text in " \
+            + CryptoDetector.human_readable_filesize(stats["package_text_bytes"]) \
+            + " of text data and " \
+            + CryptoDetector.human_readable_filesize(stats["package_binary_bytes"]) \
+            + " of binary data.")
+        if text_encodings:
+            Logger.log("Text encodings of the files read: " + ", ".join(encoding + " (" \
+                + str(text_encodings[encoding]) + " files)" for encoding in \
+                sorted(text_encodings)))
+        Logger.log(number_of_matches + " in " + package_name)
+
+        pipeline_stats = self.close_file_pipeline()
+        if pipeline_stats is not None:
+            stats["pipeline"] = pipeline_stats
+
+        Output.print_information("\nCleaning up temporary files ...")
+        self.file_lister.cleanup_tmp_folder()
+
+        return {
+            "package_name": package_name,
+            "found_matches": found_matches_in_package,
+            "crypto_data": None if self.quick else crypto_output.get_crypto_data(),
+            "stats": stats
+        }
+
+    def scan_files(self, file_list):
+        """Scan the files of a package, in parallel if there is more than one job
+
+        Args:
+            file_list: (iterable) of file path dicts; see FileLister.get_package_filelist
+
+        Returns:
+            (iterator) of the scan result of each file (see scan_file), in the order of file_list
+        """
+        if self.jobs == 1:
+            if not self.pipeline:
+                return map(self.scan_file, file_list)
+
+            # the files are listed and extracted, read and hashed, and searched in threads of
+            # their own, while the hits of the files that are done are added to the output
+            self.file_pipeline = Pipeline(file_list, [
+                ("read", self.load_file, CryptoDetector.loaded_size),
+                ("search", self.search_file_in_pipeline, None)])
+            return self.file_pipeline
+
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.jobs, initializer=init_scan_worker, \
+                initargs=(self, Output.verbose, Output.suppress_warnings))
+
+        # the files are still being listed, so they are handed out one at a time to spread them
+        # evenly among the workers
+        return self.pool.imap(scan_file_in_worker, file_list)
+
+    @staticmethod
+    def loaded_size(file_result):
+        """Size of the content a loaded file holds in memory
+
+        Args:
+            file_result: (dict) see load_file
+
+        Returns:
+            (integer) size of the content, or 0 if it is not in memory
+        """
+        if file_result["content"] is None:
+            return 0
+        return len(file_result["content"])
+
+    def close_file_pipeline(self):
+        """Stop the threads of the pipeline scanning the files of a package, if it has been
+        started, and log the depths of its queues
+
+        Args:
+            None
+
+        Returns:
+            (dict) the queue depth statistics of each stage (see Pipeline.stats), or None if
+                there was no pipeline
+        """
+        if self.file_pipeline is None:
+            return None
+
+        self.file_pipeline.close()
+        pipeline_stats = self.file_pipeline.stats()
+        self.file_pipeline = None
+
+        # the stage with a full queue in front of it, and empty queues after it, is the bottleneck
+        for stage in ["read", "search", "output"]:
+            stage_stats = pipeline_stats[stage]
+            Logger.log("Queue in front of the " + stage + " stage: mean depth " \
+                + str(round(stage_stats["mean_depth"], 2)) + ", max depth " \
+                + str(stage_stats["max_depth"]) + ", max size " \
+                + CryptoDetector.human_readable_filesize(stage_stats["max_bytes"]))
+
+        return pipeline_stats
+
+    def close_pool(self, wait=False):
+        """Stop the worker processes scanning files, if they have been started
+
+        Args:
+            wait: (bool) whether to let the workers finish their files and exit on their own,
+                which writes out the results they cached, instead of terminating them
+
+        Returns:
+            None
+        """
+        if self.pool is not None:
+            if wait:
+                self.pool.close()
+            else:
+                self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def scan_file(self, file_path):
+        """Read, hash and search a single file with all the active methods
+
+        Args:
+            file_path: (dict) with the physical_path and display_path of the file
+
+        Returns:
+            (dict) with the file "display_path", "sha1", "language" and "content", the
+                "line_index" of the content once it is searched (see LineIndex), the text
+                "encoding" it was decoded with (None if it is binary or was not read), whether it
+                "found_matches", its "hits", and the "text_bytes", "binary_bytes" and
+                "lines_of_text" it added to the package
+
+        Raises:
+            FailedFileRead
+        """
+        return self.search_file(self.load_file(file_path))
+
+    def load_file(self, file_path, stream=True):
+        """Read and hash a single file, to be searched by search_file. Files larger than the
+        stream chunk size are not read here, but streamed by search_file in chunks.
+
+        Args:
+            file_path: (dict) with the physical_path and display_path of the file
+            stream: (bool) whether the file may be streamed
+
+        Returns:
+            (dict) the scan result of the file (see scan_file), with no matches yet
+
+        Raises:
+            FailedFileRead
+        """
+        # files extracted from archives are in new temporary directories every time
+        file_stat = None
+        if self.stat_cache and file_path["display_path"] == file_path["physical_path"]:
+            try:
+                file_stat = os.stat(file_path["physical_path"])
+            except OSError:
+                # let reading the file report the error
+                pass
+            else:
+                file_result = self.load_cached_file(file_path, file_stat)
+                if file_result is not None:
+                    return file_result
+
+        if stream and self.should_stream_file(file_path["physical_path"]):
+            return {
+                "display_path": file_path["display_path"],
+                "stream_path": file_path,
+                "file_stat": file_stat,
+                "content": None,
+                "line_index": None,
+                "encoding": None,
+                "found_matches": False,
+                "hits": [],
+                "text_bytes": 0,
+                "binary_bytes": 0,
+                "lines_of_text": 0
+            }
+
+        content, language, sha1, encoding = self.read_file(file_path["physical_path"])
+
+        if content is None:
+            CryptoDetector.raise_failed_file_read(file_path)
+
+        file_result = {
+            "display_path": file_path["display_path"],
+            "sha1": sha1,
+            "language": language,
+            "content": content,
+            "line_index": None,
+            "encoding": encoding,
+            "found_matches": False,
+            "hits": [],
+            "text_bytes": 0,
+            "binary_bytes": 0,
+            "lines_of_text": 0
+        }
+
+        if language == Language.Binary:
+            file_result["binary_bytes"] = len(content)
+
+            # binary files that no method searches are only hashed; see read_file_bytes
+            if not content:
+                try:
+                    file_result["binary_bytes"] = os.path.getsize(file_path["physical_path"])
+                except OSError:
+                    pass
+        elif isinstance(content, mmap.mmap):
+            file_result["text_bytes"] = len(content)
+            file_result["lines_of_text"] = CryptoDetector.count_mapped_lines(content)
+        elif isinstance(content, bytes):
+            file_result["text_bytes"] = len(content)
+            file_result["lines_of_text"] = content.count(b"\n") + 1
+        else:
+            file_result["text_bytes"] = len(content)
+            file_result["lines_of_text"] = content.count("\n") + 1
+
+        if file_stat is not None:
+            self.result_cache.put_file(os.path.abspath(file_path["physical_path"]), file_stat, \
+                self.file_cache_settings, file_result)
+
+        return file_result
+
+    def load_cached_file(self, file_path, file_stat):
+        """Get the scan result of a local file from the caches, without reading it, if its
+        metadata and the file_cache_settings did not change since it was cached, and the hits of
+        every method in its content are cached too. Files with hits are read anyway, for the line
+        text of their hits, except in quick mode.
+
+        Args:
+            file_path: (dict) with the physical_path and display_path of the file
+            file_stat: (os.stat_result) current metadata of the file
+
+        Returns:
+            (dict) the scan result of the file (see scan_file), marked as "searched" already,
+                or None if the file has to be read
+        """
+        cached_file = self.result_cache.get_file(os.path.abspath(file_path["physical_path"]), \
+            file_stat, self.file_cache_settings)
+        if cached_file is None:
+            return None
+
+        language = Language.by_name(cached_file["language"])
+        if language is None:
+            return None
+
+        search_result = self.search_content(None, language, sha1=cached_file["sha1"])
+        if search_result is None:
+            return None
+        found_matches, method_hits = search_result
+        if method_hits:
+            return None
+
+        return {
+            "display_path": file_path["display_path"],
+            "sha1": cached_file["sha1"],
+            "language": language,
+            "content": None,
+            "line_index": None,
+            "encoding": None,
+            "searched": True,
+            "found_matches": found_matches,
+            "hits": [],
+            "text_bytes": cached_file["text_bytes"],
+            "binary_bytes": cached_file["binary_bytes"],
+            "lines_of_text": cached_file["lines_of_text"]
+        }
+
+    def search_file(self, file_result):
+        """Search a file loaded by load_file with all the active methods. A file with the same
+        content and language as a file already searched in this run is not searched again, but
+        gets copies of the same hits, unless search_duplicate_contents is set.
+
+        Args:
+            file_result: (dict) see load_file
+
+        Returns:
+            (dict) the same file_result, with whether it "found_matches" and its "hits"
+        """
+        if file_result.get("searched"):
+            return file_result
+
+        if "stream_path" in file_result:
+            file_path = file_result["stream_path"]
+            file_stat = file_result.pop("file_stat")
+            file_result = self.search_file_in_chunks(file_result)
+            self.remember_scanned_content(file_result)
+            if file_stat is not None:
+                self.result_cache.put_file(os.path.abspath(file_path["physical_path"]), \
+                    file_stat, self.file_cache_settings, file_result)
+            return file_result
+
+        content = file_result["content"]
+        content_key = CryptoDetector.content_key(file_result)
+
+        # the methods searching the content and the output share the same line index
+        file_result["line_index"] = LineIndex(content)
+        scanned_content = self.scanned_contents.get(content_key)
+
+        if scanned_content is not None:
+            self.scanned_contents.move_to_end(content_key)
+            file_result["found_matches"], hits = scanned_content
+            file_result["hits"].extend(hit.copy() for hit in hits)
+        else:
+            found_matches, method_hits = self.search_content(content, file_result["language"], \
+                file_result["display_path"], file_result["sha1"], file_result["line_index"])
+
+            file_result["found_matches"] = found_matches
+            for method_id in self.active_methods:
+                file_result["hits"].extend(method_hits.get(method_id, []))
+            self.remember_scanned_content(file_result)
+
+        # the line text of the hits is looked up before the file is unmapped
+        if isinstance(content, mmap.mmap):
+            CryptoDetector.drop_file_content(file_result)
+            content.close()
+
+        return file_result
+
+    def remember_scanned_content(self, file_result):
+        """Remember the hits of a searched file for the other files with the same content. Only
+        the most recently searched contents are remembered, so that the hits of a large scan are
+        not all kept in memory until it is done.
+
+        Args:
+            file_result: (dict) see search_file
+
+        Returns:
+            None
+        """
+        if self.search_duplicate_contents:
+            return
+
+        self.scanned_contents[CryptoDetector.content_key(file_result)] = \
+            (file_result["found_matches"], tuple(file_result["hits"]))
+        if len(self.scanned_contents) > CryptoDetector.SCANNED_CONTENTS_LIMIT:
+            self.scanned_contents.popitem(last=False)
+
+    @staticmethod
+    def content_key(file_result):
+        """Key of the content of a scanned file, which is searched the same way in every file
+        with the same SHA1 and language
+
+        Args:
+            file_result: (dict) see scan_file
+
+        Returns:
+            (tuple) of the file SHA1 and language name
+        """
+        return file_result["sha1"], str(file_result["language"])
+
+    def should_stream_file(self, path):
+        """Whether a file is large enough to be streamed in chunks. Binary files are only
+        streamed if none of the active methods searches them.
+
+        Args:
+            path: (string) file path
+
+        Returns:
+            (bool)
+        """
+        if self.stream_chunk_size is None:
+            return False
+
+        try:
+            if os.path.getsize(path) <= self.stream_chunk_size:
+                return False
+        except OSError:
+            # let reading the file report the error
+            return False
+
+        language = self.guess_file_language(path)
+        return language == Language.Unknown or language.is_text \
+            or not self.searches_binary_files()
+
+    def searches_binary_files(self):
+        """Whether any of the active methods searches binary files
+
+        Args:
+            None
+
+        Returns:
+            (bool)
+        """
+        return any(method.supports_scanning_file(Language.Binary) \
+            for method in self.active_methods.values())
+
+    def search_file_in_chunks(self, file_result):
+        """Hash and search a large file one chunk at a time, instead of reading it all into
+        memory. The text of the file is decoded the same way as read_file would, and the
+        matches have the same file indexes, line numbers and line text as if the whole file was
+        searched at once.
+
+        Args:
+            file_result: (dict) see load_file
+
+        Returns:
+            (dict) the same file_result, with the file "sha1", "language", text "encoding",
+                whether it "found_matches", its "hits", and its "text_bytes", "binary_bytes" and
+                "lines_of_text"
+
+        Raises:
+            FailedFileRead
+        """
+        file_path = file_result.pop("stream_path")
+        path = file_path["physical_path"]
+        language = self.guess_file_language(path)
+
+        if language == Language.Unknown or language.is_text:
+            try:
+                with open(path, "rb") as content_file:
+                    prefix = content_file.read(max(CryptoDetector.ENCODING_SNIFF_SIZE, \
+                        self.text_check_size))
+            except (OSError, IOError) as expn:
+                Output.print_error("Critical error while reading file " + path + "\n" \
+                    + str(expn))
+                CryptoDetector.raise_failed_file_read(file_path)
+
+            if language == Language.Unknown:
+                language = self.sniff_file_language(prefix)
+
+        # the file may have turned out to be binary from its magic number
+        if language == Language.Unknown or language.is_text:
+            text_language = language
+            text_encodings = CryptoDetector.text_encodings(prefix)
+            if language == Language.Unknown:
+                text_language = Language.PlainText
+                if self.has_nontext_characters(prefix[:self.text_check_size]):
+                    text_encodings = []
+
+            for encoding in text_encodings:
+                try:
+                    self.search_text_file_in_chunks(file_result, path, text_language, encoding)
+                    file_result["encoding"] = encoding
+                    return file_result
+
+                except UnicodeError:
+                    continue
+
+                except (OSError, IOError) as expn:
+                    Output.print_error("Critical error while reading file " + path + "\n" \
+                        + str(expn))
+                    CryptoDetector.raise_failed_file_read(file_path)
+
+            else:
+                if language != Language.Unknown:
+                    Output.print_error("Couldn't decode the text file " + \
+                        path + "using any of Unicode, Latin, ISO-8859, or EBCDIC encodings." + \
+                        " Will treat as binary.")
+
+        if self.searches_binary_files():
+            return self.search_file(self.load_file(file_path, stream=False))
+
+        sha1 = hashlib.sha1()
+        try:
+            with open(path, "rb") as content_file:
+                file_result["binary_bytes"] = CryptoDetector.hash_file(content_file, sha1)
+
+        except (OSError, IOError) as expn:
+            Output.print_error("Critical error while reading file " + path + "\n" + str(expn))
+            CryptoDetector.raise_failed_file_read(file_path)
+
+        file_result["sha1"] = sha1.hexdigest()
+        file_result["language"] = Language.Binary
+        return file_result
+
+    def search_text_file_in_chunks(self, file_result, path, language, encoding):
+        """Hash and search a text file one chunk at a time. Since matches never span multiple
+        lines, the text is searched a few whole lines at a time, along with the lines before and
+        after them that make up the line text of their hits.
+
+        Lines that are too long for a chunk, such as the ones of minified files, are searched a
+        part at a time instead, with an overlap of the longest match between the parts. The line
+        text of their hits is then clamped to the part around the hit, and so are the lines
+        before them when they are longer than a chunk.
+
+        Args:
+            file_result: (dict) see search_file_in_chunks
+            path: (string) file path
+            language: language of the file (see langauges.py)
+            encoding: (string) text encoding of the file
+
+        Returns:
+            None
+
+        Raises:
+            UnicodeError if the file cannot be decoded with the given encoding, and OSError or
+                IOError if it cannot be read
+        """
+        context_lines = max(abs(line_offset) for line_offset \
+            in CryptoOutput.LINE_TEXT_FIELDS.values())
+
+        sha1 = hashlib.sha1()
+        text_bytes = 0
+        new_line_count = 0
+        searching = True
+        found_matches = False
+        method_hits = {}
+        display_path = file_result["display_path"]
+
+        # the lines before the text still to be searched, the text read but not searched yet,
+        # and the file index and number of lines before the lines before it, and the number of
+        # characters of their first line before them, which were left out
+        before = ""
+        pending = ""
+        text_offset = 0
+        line_offset = 0
+        line_column = 0
+
+        decoder = CryptoDetector.text_decoder(encoding)
+        with open(path, "rb") as content_file:
+            while True:
+                raw_chunk = content_file.read(self.stream_chunk_size)
+                at_end = not raw_chunk
+
+                # keep decoding the rest of the file even when it is no longer searched, since
+                # read_file would try the next encoding if it fails to decode
+                chunk = decoder.decode(raw_chunk, final=at_end)
+                text_bytes += len(chunk)
+                new_line_count += chunk.count("\n")
+                sha1.update(raw_chunk)
+
+                if not searching:
+                    if at_end:
+                        break
+                    continue
+
+                pending += chunk
+
+                if not at_end:
+                    # search up to the lines after which there are enough whole lines for the
+                    # line text of their hits, and search the rest with the next chunk
+                    search_end = len(pending)
+                    for _ in range(context_lines + 1):
+                        search_end = pending.rfind("\n", 0, search_end)
+                        if search_end == -1:
+                            break
+                    if search_end != -1:
+                        search_end += 1
+                        text_end = pending.rfind("\n") + 1
+                    elif len(pending) > self.stream_chunk_size \
+                        and self.max_match_length is not None:
+                        # search up to where no match can reach the end of the text read so
+                        # far, including the character after it that decides a boundary
+                        search_end = len(pending) - self.max_match_length - 1
+                        text_end = len(pending)
+                        if search_end <= 0:
+                            continue
+                    else:
+                        continue
+                elif pending:
+                    search_end = text_end = len(pending)
+                else:
+                    break
+
+                text = before + pending[:text_end]
+                search_begin = len(before)
+                search_end += search_begin
+
+                line_index = LineIndex(text)
+                chunk_found_matches, chunk_method_hits = self.search_content(text, language, \
+                    display_path, line_index=line_index)
+                display_path = None
+
+                if self.quick:
+                    if chunk_found_matches:
+                        found_matches = True
+                        searching = False
+                        pending = ""
+                    else:
+                        pending = pending[search_end - search_begin:]
+                        before, text_offset, line_offset, line_column = \
+                            self.next_chunk_text(text, search_end, context_lines, text_offset, \
+                            line_offset, line_column)
+                    continue
+
+                for method_id, hits in chunk_method_hits.items():
+                    hits = [hit for hit in hits \
+                        if search_begin <= hit.file_index_begin < search_end]
+                    if not hits:
+                        continue
+                    found_matches = True
+
+                    CryptoOutput.fill_hits_line_text([(hit, line_index) for hit in hits \
+                        if hit.line_text is None])
+
+                    for hit in hits:
+                        hit.file_index_begin += text_offset
+                        hit.file_index_end += text_offset
+                        if isinstance(hit.line_number, int):
+                            if hit.line_number == 1:
+                                hit.line_index_begin += line_column
+                                hit.line_index_end += line_column
+                            hit.line_number += line_offset
+
+                    method_hits.setdefault(method_id, []).extend(hits)
+
+                pending = pending[search_end - search_begin:]
+                before, text_offset, line_offset, line_column = self.next_chunk_text(text, \
+                    search_end, context_lines, text_offset, line_offset, line_column)
+
+        file_result["sha1"] = sha1.hexdigest()
+        file_result["language"] = language
+        file_result["text_bytes"] = text_bytes
+        file_result["lines_of_text"] = new_line_count + 1
+        file_result["found_matches"] = found_matches
+        for method_id in self.active_methods:
+            file_result["hits"].extend(method_hits.get(method_id, []))
+
+    def next_chunk_text(self, text, search_end, context_lines, text_offset, line_offset, \
+        line_column):
+        """Keep the last lines of the part of a text that was searched, for the line text of the
+        hits in the text after it. At most a chunk of them is kept, so lines longer than a chunk
+        are cut at their beginning.
+
+        Args:
+            text: (string) the text that was searched, starting with the lines before it
+            search_end: (integer) index in text after the last character that was searched
+            context_lines: (integer) number of whole lines to keep before the line of search_end
+            text_offset: (integer) file index of the beginning of text
+            line_offset: (integer) number of lines before text
+            line_column: (integer) number of characters of the first line of text before it
+
+        Returns:
+            (string, integer, integer, integer) the lines before the next text, their file
+                index, the number of lines before them, and the number of characters of their
+                first line before them
+        """
+        before_begin = search_end
+        for _ in range(context_lines + 1):
+            before_begin = text.rfind("\n", 0, before_begin)
+            if before_begin == -1:
+                break
+        before_begin += 1
+        if before_begin:
+            line_column = 0
+
+        cut = search_end - before_begin - max(self.stream_chunk_size, \
+            self.max_match_length or 0)
+        if cut > 0:
+            new_line = text.rfind("\n", before_begin, before_begin + cut)
+            if new_line == -1:
+                line_column += cut
+            else:
+                line_column = before_begin + cut - new_line - 1
+            before_begin += cut
+
+        return text[before_begin:search_end], text_offset + before_begin, \
+            line_offset + text.count("\n", 0, before_begin), line_column
+
+    def search_content(self, content, language, display_path=None, sha1=None, line_index=None):
+        """Search file content with all the active methods, or look up their hits in the result
+        cache
+
+        Args:
+            content: (string) or (bytes) file content, or (bytes) or (mmap) the raw content of an
+                ASCII text file (see read_file), or None to only look up the hits in the result
+                cache
+            language: language of the content (see langauges.py)
+            display_path: (string) path of the file to print out, or None to not print it
+            sha1: (string) SHA1 of the content, or None to not use the result cache
+            line_index: (LineIndex) of the content shared by the methods, or None to create one
+
+        Returns:
+            (bool, dict) whether any of the methods found matches, and the method id -> list of
+                Hits found by each method that found matches (empty in quick mode), or None if
+                there is no content and the hits of a method are not cached
+        """
+        found_matches = False
+        method_hits = {}
+        raw_text = content is not None and not isinstance(content, str) and language.is_text
+        if line_index is None and content is not None:
+            line_index = LineIndex(content)
+        text = None
+        results_to_cache = []
+
+        for method_id in self.active_methods:
+            method = self.active_methods[method_id]
+
+            if not method.supports_scanning_file(language):
+                continue
+
+            if self.source_files_only and not language.is_source_code:
+                continue
+
+            # the methods that do not search bytes get the decoded text of an ASCII text file
+            method_content = content
+            if raw_text and not method.supports_bytes_content(language):
+                if text is None:
+                    text = str(content, "ascii")
+                method_content = text
+
+            method_key = None
+            if self.result_cache is not None and sha1 is not None:
+                method_key = method.result_cache_key()
+                if method_key is not None:
+                    method_key = method_id + ":" + method_key
+
+            if method_key is not None:
+                hits = self.result_cache.get(sha1, str(language), method_key)
+                if hits is not None:
+                    if hits:
+                        found_matches = True
+                        if self.quick:
+                            break
+                        method_hits[method_id] = hits
+                    continue
+
+            if content is None:
+                return None
+
+            if display_path is not None:
+                Output.print_information("[" + method.method_id \
+                    + "] Scanning file " + display_path)
+
+            if self.quick:
+                if method.quick_search(method_content, language):
+                    found_matches = True
+                    break
+                continue
+
+            result = method.search_indexed(method_content, language, line_index)
+
+            hits = []
+            for match in result:
+                match["detection_method"] = method_id
+                hits.append(self.validate_match_fields(method_id, match))
+
+            if method_key is not None:
+                results_to_cache.append((method_key, hits))
+
+            if not hits:
+                continue
+            else:
+                found_matches = True
+
+            method_hits[method_id] = hits
+
+        if results_to_cache:
+            self.result_cache.put(sha1, str(language), results_to_cache)
+
+        return found_matches, method_hits
+
+    def search_file_in_pipeline(self, file_result):
+        """Search a file in the pipeline of scan_files. The line text of its hits is filled here,
+        while the line index of the file is still at hand, so that its content can be dropped
+        before it waits for the output.
+
+        Args:
+            file_result: (dict) see load_file
+
+        Returns:
+            (dict) the scan result of the file, without its content; see scan_file
+        """
+        return CryptoDetector.drop_file_content(self.search_file(file_result))
+
+    @staticmethod
+    def drop_file_content(file_result):
+        """Fill the line text of the hits of a scanned file, and drop its content
+
+        Args:
+            file_result: (dict) see scan_file
+
+        Returns:
+            (dict) the same file_result, with its "content" set to None
+        """
+        CryptoOutput.fill_hits_line_text([(hit, file_result["line_index"]) \
+            for hit in file_result["hits"] if hit.line_text is None])
+        file_result["content"] = None
+        file_result["line_index"] = None
+        return file_result
+
+    @staticmethod
+    def raise_failed_file_read(file_path):
+        """Report that a file could not be read
+
+        Args:
+            file_path: (dict) with the physical_path and display_path of the file
+
+        Returns:
+            None
+
+        Raises:
+            FailedFileRead
+        """
+        raise FailedFileRead("Failed to open the file '" + file_path["display_path"] \
+            + "' to read its contents. Please run the scan with --log and open the log" \
+            + " file for details of this error.")
+
+    def validate_match_fields(self, method_id, match):
+        """Validate the output fields of the match. Hit objects always have all the output
+        fields. If a match dict is missing a required field, InvalidMethodException will be
+        thrown, otherwise it is converted to a Hit with the missing fields added as blank.
 
         Args:
             method_id: (string)
-            match_dict: (dict)
+            match: (Hit) or (dict)
 
         Returns:
-            A match dict with the expected fields added as blank
+            (Hit) the match with all the expected fields
 
         Raises:
             InvalidMethodException
         """
-        match_dict_with_missing_fields = copy.copy(match_dict)
-        EMPTY_VALUE = ""
+        if isinstance(match, Hit):
+            return match
 
-        for required_field in CryptoOutput.required_output_fields():
-            if required_field not in match_dict:
-                if CryptoOutput.required_output_fields()[required_field]:
-                    raise InvalidMethodException("Invalid Method " + method_id \
-                        + ". Missing required output field '" \
-                        + required_field + "' in the match object.")
-                else:
-                    match_dict_with_missing_fields[required_field] = EMPTY_VALUE
-        return match_dict_with_missing_fields
+        for required_field, is_required in Hit.FIELDS.items():
+            if is_required and required_field not in match:
+                raise InvalidMethodException("Invalid Method " + method_id \
+                    + ". Missing required output field '" \
+                    + required_field + "' in the match object.")
+        return Hit(**match)
 
 
     def write_crypto_file(self, json_data, output_directory, package_name):
@@ -417,12 +1400,7 @@ class CryptoDetector(object):
         try:
             with open(output_file, 'w') as file_object:
 
-                if self.pretty:
-                    JSON_string = json.dumps(json_data, sort_keys=True, indent=2)
-                else:
-                    JSON_string = json.dumps(json_data)
-
-                file_object.write(JSON_string)
+                file_object.write(CryptoOutput.to_json(json_data, self.pretty))
 
         except (OSError, IOError) as e:
             raise FileWriteException("Failed to write result in the crypto file " + output_file \
@@ -454,15 +1432,22 @@ class CryptoDetector(object):
     def has_nontext_characters(content):
         """Determine if the characters in a file are outside the scope of text file characters as defined here:
         https://github.com/file/file/blob/f2a6e7cb7db9b5fd86100403df6b2f830c7f22ba/src/encoding.c#L151-L228
+        The raw bytes of the file are checked before decoding it, except for UTF-16 and UTF-32
+        text (see sniff_encoding) whose characters are checked instead.
 
         Args:
-            content: (string)
+            content: (bytes) the bytes at the beginning of the file
 
         Returns:
             (bool)
         """
-        text_chars = set([7, 8, 9, 10, 11, 12, 13, 27]) | set(range(0x20, 0x100)) - set([0x7f])
-        return bool(content.translate({c: None for c in bytearray(text_chars)}))
+        encoding = CryptoDetector.sniff_encoding(content)
+        if encoding is None:
+            return bool(content.translate(None, CryptoDetector.TEXT_BYTES))
+
+        # the last character may be cut off
+        text = codecs.getincrementaldecoder(encoding)(errors="replace").decode(content)
+        return CryptoDetector.NONTEXT_CHARACTERS_REGEX.search(text) is not None
 
     def read_text_file(self, path):
         """Try multiple different text encodings to read a text file
@@ -471,30 +1456,100 @@ class CryptoDetector(object):
             path: (string) file path
 
         Returns:
-            (string, string) the content of the file and its encoding
-            None if it failed to read the file
+            (string) the content of the file
+            None if it failed to read or decode the file
         """
-        text_encodings = ["utf-8", "latin-1", "iso-8859-1", "utf-16", "utf-32", "cp500"]
-        content = None
+        content = self.read_binary_file(path)
+        if content is None:
+            return None
+        return CryptoDetector.decode_text(content)[0]
 
-        for encoding in text_encodings:
-            try:
-                with open(path, 'r', encoding=encoding) as content_file:
-                    content = content_file.read()
-                    break
+    @staticmethod
+    def decode_text(content):
+        """Try multiple different text encodings to decode the content of a text file, the same
+        way as reading the file in text mode would
+
+        Args:
+            content: (bytes) raw content of the file
 
-            except ValueError as expn:
+        Returns:
+            (string, string) the decoded text and its encoding, or (None, None) if none of the
+                encodings could decode it
+        """
+        for encoding in CryptoDetector.text_encodings(content):
+            try:
+                return CryptoDetector.text_decoder(encoding).decode(content, final=True), \
+                    encoding
+            except ValueError:
                 continue
+        return None, None
 
-            except (OSError, IOError) as expn:
-                Output.print_error("Critical error while reading file " + path + "\n" + str(expn))
-                return content
+    @staticmethod
+    def text_encodings(prefix):
+        """Encodings to try one after another to decode a text file
 
-            except Exception as expn:
-                Output.print_error("Exception while opening file " + path + "\n" + str(expn))
-                return content
+        Args:
+            prefix: (bytes) the first bytes of the file
 
-        return content
+        Returns:
+            (list) of encodings, starting with the one sniffed from the prefix if any
+        """
+        sniffed_encoding = CryptoDetector.sniff_encoding(prefix)
+        if sniffed_encoding is None:
+            return CryptoDetector.TEXT_ENCODINGS
+        return [sniffed_encoding] + [encoding for encoding in CryptoDetector.TEXT_ENCODINGS \
+            if encoding != sniffed_encoding]
+
+    @staticmethod
+    def sniff_encoding(prefix):
+        """Sniff UTF-16 or UTF-32 text from the byte order mark at the beginning of a file, or
+        from the null bytes of its first characters if it has none. Since most characters of a
+        text file are ASCII, most bytes but the lowest of each character are null in these
+        encodings, while the lowest are not.
+
+        Args:
+            prefix: (bytes) the first bytes of the file
+
+        Returns:
+            (string) the sniffed encoding, or None if the file is not UTF-16 or UTF-32 text
+        """
+        for byte_order_mark, encoding in CryptoDetector.BYTE_ORDER_MARKS:
+            if prefix.startswith(byte_order_mark):
+                return encoding
+
+        prefix = prefix[:CryptoDetector.ENCODING_SNIFF_SIZE]
+        prefix = prefix[:len(prefix) - len(prefix) % 4]
+        if not prefix:
+            return None
+
+        # whether each byte of the groups of four bytes is mostly null, or never null
+        null_counts = [prefix[index::4].count(0) for index in range(4)]
+        mostly_null = tuple(2 * null_count > len(prefix) // 4 for null_count in null_counts)
+        never_null = tuple(null_count == 0 for null_count in null_counts)
+
+        if never_null[0] and all(mostly_null[1:]):
+            return "utf-32-le"
+        if all(mostly_null[:3]) and never_null[3]:
+            return "utf-32-be"
+        if never_null[0] and never_null[2] and mostly_null[1] and mostly_null[3]:
+            return "utf-16-le"
+        if mostly_null[0] and mostly_null[2] and never_null[1] and never_null[3]:
+            return "utf-16-be"
+        return None
+
+    @staticmethod
+    def text_decoder(encoding):
+        """Incremental decoder of text in an encoding, which translates the new lines of the text
+        to "\n" like reading a file in text mode does
+
+        Args:
+            encoding: (string) text encoding
+
+        Returns:
+            (io.IncrementalNewlineDecoder)
+        """
+        return io.IncrementalNewlineDecoder(codecs.getincrementaldecoder(encoding)(), \
+            translate=True)
 
     def read_binary_file(self, path):
         """Read a binary file
@@ -522,62 +1577,296 @@ class CryptoDetector(object):
 
         return content
 
-    def read_file(self, path):
-        """Reads a file at the given path to return its content and language
+    def map_text_file(self, path, language):
+        """Map an ASCII text file in memory, so that the methods can search it without reading it
+        into a string. The file is only mapped if its content is exactly the same as the text
+        read_text_file would read from it.
 
         Args:
             path: (string) file path
+            language: language of the file guessed from its extension (see langauges.py)
 
         Returns:
-            tuple (file content, language) file content is either a str or bytes array depending
-                on whether or not it is binary.
+            (mmap, language) the mapped file and its language, or (None, language) if it is not
+                an ASCII text file or cannot be mapped. The language of a file whose extension
+                is not known is sniffed from its content, or is PlainText.
         """
-        content = None
+        try:
+            with open(path, "rb") as content_file:
+                content = mmap.mmap(content_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, IOError, ValueError):
+            return None, language
+
+        prefix = content[:max(CryptoDetector.ENCODING_SNIFF_SIZE, self.text_check_size)]
+        if language == Language.Unknown:
+            language = self.sniff_file_language(prefix)
+
+        # the null bytes of UTF-16 or UTF-32 text are ASCII too
+        if language == Language.Binary \
+            or CryptoDetector.UNMAPPABLE_TEXT_REGEX.search(content) is not None \
+            or CryptoDetector.sniff_encoding(prefix[:CryptoDetector.ENCODING_SNIFF_SIZE]) \
+            or (language == Language.Unknown \
+            and self.has_nontext_characters(prefix[:self.text_check_size])):
+            content.close()
+            return None, language
+
+        if language == Language.Unknown:
+            language = Language.PlainText
+        return content, language
+
+    @staticmethod
+    def count_mapped_lines(content):
+        """Count the lines of a mapped text file, a block at a time
+
+        Args:
+            content: (mmap) see map_text_file
 
+        Returns:
+            (integer) the number of new line characters plus one
+        """
+        block_size = 1024 * 1024
+        return sum(content[begin:begin + block_size].count(b"\n") \
+            for begin in range(0, len(content), block_size)) + 1
+
+    def guess_file_language(self, path):
+        """Guess the language of a file from its name or extension (see
+        Language.guess_language). The language of a file whose name and extension are not known
+        is sniffed from its content once it is read (see sniff_file_language).
+
+        Args:
+            path: (string) file path
+
+        Returns:
+            language of the file (see langauges.py), Language.Unknown if it cannot be guessed
+        """
         filename, file_extension = os.path.splitext(path)
         file_extension = file_extension.split(".")[-1].lower()
+        return Language.guess_language(file_extension, os.path.basename(path))
+
+    def sniff_file_language(self, prefix):
+        """Sniff the language of a file whose extension is not known from its first bytes (see
+        Language.sniff_language). A magic number is only trusted if the first bytes also have
+        non-text characters, so that a text file which happens to begin with one is searched.
+
+        Args:
+            prefix: (bytes) the first bytes of the file
 
-        language = Language.guess_language(file_extension)
+        Returns:
+            the language, or Language.Unknown if it cannot be guessed
+        """
+        language = Language.sniff_language(prefix)
+        if language == Language.Binary \
+            and not self.has_nontext_characters(prefix[:self.text_check_size]):
+            return Language.Unknown
+        return language
+
+    def read_file(self, path):
+        """Reads a file at the given path to return its content, language, SHA1 and text
+        encoding. The file is read once, and the SHA1 is that of its raw bytes, whatever their
+        text encoding.
+
+        Args:
+            path: (string) file path
+
+        Returns:
+            tuple (file content, language, SHA1, encoding) file content is either a str or bytes
+                array depending on whether or not it is binary, or the raw bytes of an ASCII text
+                file (see is_ascii_text), mapped in memory if it is at least mmap_threshold
+                bytes large. The content is None if it failed to read the file, and the encoding
+                is None unless the file is text.
+        """
+        content = None
+        language = self.guess_file_language(path)
+
+        if self.mmap_threshold is not None \
+            and (language == Language.Unknown or language.is_text):
+            try:
+                large_file = os.path.getsize(path) >= self.mmap_threshold
+            except OSError:
+                large_file = False
+            if large_file:
+                content, language = self.map_text_file(path, language)
+                if content is not None:
+                    # an ASCII file is valid UTF-8, the first encoding tried
+                    return content, language, hashlib.sha1(content).hexdigest(), "utf-8"
+
+        raw_content, language, sha1 = self.read_file_bytes(path, language)
+        if raw_content is None:
+            return None, language, None, None
+
+        # the raw content of an ASCII text file is the same as its decoded text, so the methods
+        # that search bytes search it as it is, and only the lines of their hits are decoded
+        if (language == Language.Unknown or language.is_text) \
+            and CryptoDetector.is_ascii_text(raw_content):
+            if language == Language.Unknown:
+                language = Language.PlainText
+            return raw_content, language, sha1, "utf-8"
 
         if language == Language.Unknown:
 
-            # if we couldn't guess the type of the file from its extension, try to open it
-            # as plain text, and if that failed, treat it as binary, but if that succeeded,
-            # check the characters in the file to ensure it is a text file.
+            # if we couldn't guess the type of the file from its extension nor from the bytes at
+            # its beginning, but they are text characters, try to decode it as plain text, and
+            # if that failed, treat it as binary.
 
-            content = self.read_text_file(path)
+            content, encoding = CryptoDetector.decode_text(raw_content)
 
             if content is None:
-                content = self.read_binary_file(path)
+                content = raw_content
                 language = Language.Binary
-
+                encoding = None
             else:
-                if self.has_nontext_characters(content):
-                    content = self.read_binary_file(path)
-                    language = Language.Binary
-                else:
-                    language = Language.PlainText
+                language = Language.PlainText
 
         else:
             if language.is_text:
-                content = self.read_text_file(path)
+                content, encoding = CryptoDetector.decode_text(raw_content)
 
                 if content is None:
                     Output.print_error("Couldn't decode the text file " + \
                         path + "using any of Unicode, Latin, ISO-8859, or EBCDIC encodings." + \
                         " Will treat as binary.")
-                    content = self.read_binary_file(path)
+                    content = raw_content
                     language = Language.Binary
             else:
-                content = self.read_binary_file(path)
+                content = raw_content
                 language = Language.Binary
+                encoding = None
 
 
-        if content is not None:
-            if language == Language.Binary:
-                self.package_binary_bytes += len(content)
-            else:
-                self.package_text_bytes += len(content)
-                self.package_lines_of_text += len(content.split("\n"))
+        return content, language, sha1, encoding
 
-        return content, language
+    @staticmethod
+    def is_ascii_text(content):
+        """Whether the raw content of a text file is exactly the same as its decoded text: ASCII
+        without carriage returns, which reading the file as text would translate, and not UTF-16
+        or UTF-32 text, whose null bytes are ASCII too
+
+        Args:
+            content: (bytes) raw content of the file
+
+        Returns:
+            (bool)
+        """
+        return not content.translate(None, CryptoDetector.ASCII_BYTES) and b"\r" not in content \
+            and CryptoDetector.sniff_encoding(content[:CryptoDetector.ENCODING_SNIFF_SIZE]) is None
+
+    def read_file_bytes(self, path, language):
+        """Read and hash the raw bytes of a file. A file whose extension is not known is
+        sniffed from its first bytes (see sniff_file_language), and is binary if they have
+        non-text characters. Binary files are hashed with a fixed buffer instead of being read
+        into memory, unless an active method searches binary files.
+
+        Args:
+            path: (string) file path
+            language: language of the file guessed from its extension (see langauges.py)
+
+        Returns:
+            tuple (file content, language, SHA1) the content is b"" if the file is binary and
+                was only hashed, or None if it failed to read the file. The language is still
+                unknown if the first bytes of the file are text characters.
+        """
+        try:
+            with open(path, "rb") as content_file:
+                content = b""
+                if language == Language.Unknown:
+                    content = content_file.read(max(CryptoDetector.ENCODING_SNIFF_SIZE, \
+                        self.text_check_size))
+                    language = self.sniff_file_language(content)
+                    if language == Language.Unknown \
+                        and self.has_nontext_characters(content[:self.text_check_size]):
+                        language = Language.Binary
+
+                if language == Language.Binary and not self.searches_binary_files():
+                    sha1 = hashlib.sha1(content)
+                    CryptoDetector.hash_file(content_file, sha1)
+                    return b"", language, sha1.hexdigest()
+
+                content += content_file.read()
+
+        except (OSError, IOError) as expn:
+            Output.print_error("Critical error while reading file " + path + "\n" + str(expn))
+            return None, language, None
+
+        return content, language, hashlib.sha1(content).hexdigest()
+
+    @staticmethod
+    def hash_file(content_file, sha1):
+        """Hash the rest of a file with a fixed buffer
+
+        Args:
+            content_file: (file) opened in binary mode
+            sha1: (hashlib.sha1) to update with the bytes of the file
+
+        Returns:
+            (integer) the number of bytes hashed
+        """
+        buffer = bytearray(CryptoDetector.HASH_BUFFER_SIZE)
+        buffer_view = memoryview(buffer)
+        size = 0
+        while True:
+            read_size = content_file.readinto(buffer)
+            if not read_size:
+                return size
+            sha1.update(buffer_view[:read_size])
+            size += read_size
+
+
+# crypto detector of a worker process scanning files; see CryptoDetector.scan_files
+scan_worker = None
+
+def init_scan_worker(crypto_detector, verbose, suppress_warnings):
+    """Initialize a worker process scanning files
+
+    Args:
+        crypto_detector: (CryptoDetector) with the active methods to scan the files with
+        verbose: (bool) Output.verbose of the main process
+        suppress_warnings: (bool) Output.suppress_warnings of the main process
+
+    Returns:
+        None
+    """
+    global scan_worker
+    scan_worker = crypto_detector
+
+    # daemonic worker processes cannot start processes of their own
+    scan_worker.jobs = 1
+    scan_worker.package_jobs = 1
+    Output.verbose = verbose
+    Output.suppress_warnings = suppress_warnings
+
+    # the results the worker cached are written out when it exits; see close_pool
+    if scan_worker.result_cache is not None:
+        multiprocessing.util.Finalize(scan_worker.result_cache, scan_worker.result_cache.close, \
+            exitpriority=0)
+
+def scan_file_in_worker(file_path):
+    """Scan a file in a worker process. The content of the file is not sent back to the main
+    process, so the line text of the hits is filled here, and the errors logged while scanning
+    the file are sent back instead of being logged in the worker.
+
+    Args:
+        file_path: (dict) with the physical_path and display_path of the file
+
+    Returns:
+        (dict) the scan result of the file; see CryptoDetector.scan_file
+    """
+    Logger.errors = ""
+    file_result = CryptoDetector.drop_file_content(scan_worker.scan_file(file_path))
+    file_result["errors"] = Logger.errors
+
+    return file_result
+
+def scan_package_path_in_worker(package_path):
+    """Scan the packages at a path in a worker process, sending back the events and errors
+    logged while scanning them
+
+    Args:
+        package_path: (string)
+
+    Returns:
+        (dict) the results of the packages at the path; see CryptoDetector.scan_package_paths
+    """
+    Logger.events = ""
+    Logger.errors = ""
+    package_results = scan_worker.scan_package_path(package_path)
+    return {"packages": package_results, "events": Logger.events, "errors": Logger.errors}
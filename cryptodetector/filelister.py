@@ -80,7 +80,9 @@ class FileLister():
                 A file-list is a dict object containing "package_name", "package_root", and
                 "file_list". package_name is a string for name of the package, package_root is the
                 directory containing the package (None if package is not a local one), and
-                "file_list" is a list of in the package. A file is a dict with two keys
+                "file_list" is an iterable of the files in the package, listed as they are
+                consumed (directories are walked and the archives inside them are extracted
+                lazily). A file is a dict with two keys
                 "display_path" and "physical_path". "display_path" is the path that's shown to the
                 user, but might not neccessarily be where the file physically resides, whereas
                 "physical_path" is where file can be accessed. For example,
@@ -143,6 +145,24 @@ class FileLister():
                     + ". It wasn't a file, directory, an archive, " \
                     + "a wild-card expression, github address, or a URL.")
 
+    @staticmethod
+    def expand_wild_cards(package_list):
+        """Replace each wild-card address in a list of packages with the paths it matches
+
+        Args:
+            package_list: (list) list of strings specifying packages
+
+        Returns:
+            (list) of package paths
+        """
+        result = []
+        for package in package_list:
+            if not isfile(package) and not isdir(package) and FileLister.is_wild_card(package):
+                result.extend(glob.glob(package))
+            else:
+                result.append(package)
+        return result
+
     def skip_package(self, package_name, package_root):
         """Check to see if we should skip listing this package if the crypto file already exists
 
@@ -257,7 +277,7 @@ class FileLister():
         return [{
             "package_name": package_name,
             "package_root": package_root,
-            "file_list": self.get_directory_filelist(path, tmp_root_path, current_path)
+            "file_list": self.iter_directory_files(path, tmp_root_path, current_path)
         }]
 
     def get_directory_filelist(self, path, tmp_root_path, current_path):
@@ -275,8 +295,23 @@ class FileLister():
             "physical_path". "display_path" is the path that's shown to the user and "physical_path"
             is where file can be accessed.
         """
-        file_list = []
+        return list(self.iter_directory_files(path, tmp_root_path, current_path))
 
+    def iter_directory_files(self, path, tmp_root_path, current_path):
+        """Recursively list all the files in a directory as they are found, walking the directory
+        and extracting the archives inside only as far as the files have been consumed.
+
+        Args:
+            path: (string) path of the directory
+            tmp_root_path: (string) if the directory is inside of a tmp directory, this is the
+                address of that directory, otherwise null.
+            current_path: (string) current address within the temporary directory. If we are not in
+                a tmp directory, this is also null. This is used to compute the display path.
+
+        Returns:
+            (generator) of files, where each file is a dict with two keys "display_path" and
+            "physical_path"; see get_directory_filelist
+        """
         for dirpath, _, filenames in walk(path, followlinks=False):
             for filename in filenames:
                 full_path = abspath(join(dirpath, filename))
@@ -300,18 +335,17 @@ class FileLister():
                         Output.print_error(str(expn))
                         continue
 
-                    file_list.extend(self.get_directory_filelist(tmp_dir, \
-                        tmp_root_path=tmp_dir, current_path=display_path))
+                    for file_path in self.iter_directory_files(tmp_dir, \
+                        tmp_root_path=tmp_dir, current_path=display_path):
+                        yield file_path
                 else:
                     if tmp_root_path:
-                        file_list.append({
+                        yield {
                             "display_path": join(current_path, relpath(full_path, tmp_root_path)),
                             "physical_path": full_path
-                        })
+                        }
                     else:
-                        file_list.append({"display_path": full_path, "physical_path": full_path})
-
-        return file_list
+                        yield {"display_path": full_path, "physical_path": full_path}
 
     def list_url(self, url):
         """List the file(s) at the given URL
@@ -0,0 +1,165 @@
+"""
+Copyright (c) 2017 Wind River Systems, Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software  distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES
+OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+
+from operator import attrgetter
+
+class Hit(object):
+    """A match found by a method, holding its output fields in slots rather than in a dict, since
+    a package can have hundreds of thousands of them. It can be read, written and compared like
+    the dict of its output fields, and is only converted to one when the JSON output is written.
+    """
+
+    # output fields of every hit, and whether a method is required to provide them (see
+    # CryptoOutput.required_output_fields)
+    FIELDS = {
+        "comments": False,
+        "human_reviewed": False,
+        "line_text": False,
+        "line_text_after_1": False,
+        "line_text_after_2": False,
+        "line_text_after_3": False,
+        "line_text_before_1": False,
+        "line_text_before_2": False,
+        "line_text_before_3": False,
+        "file_index_begin": True,
+        "file_index_end": True,
+        "line_index_begin": False,
+        "line_index_end": False,
+        "line_number": False,
+        "matched_text": True,
+        "evidence_type": True,
+        "detection_method": True,
+        "encryption_api_usage": False,
+        "encryption_library": False
+    }
+
+    __slots__ = tuple(FIELDS) + ("extra_fields",)
+
+    # values of the output fields, in the order of FIELDS
+    field_values = attrgetter(*FIELDS)
+
+    def __init__(self, matched_text, file_index_begin, file_index_end, evidence_type, \
+        detection_method="", line_number="", line_index_begin="", line_index_end="", \
+        comments="", human_reviewed="", encryption_api_usage="", encryption_library="", \
+        line_text=None, line_text_before_1=None, line_text_before_2=None, \
+        line_text_before_3=None, line_text_after_1=None, line_text_after_2=None, \
+        line_text_after_3=None, **extra_fields):
+        """The fields that are not given are blank, except for the line text fields which are left
+        to be filled by CryptoOutput. Fields that are not output fields of every hit are kept
+        in extra_fields.
+
+        Args:
+            matched_text, file_index_begin, ..., line_text_after_3: output fields of the hit; see
+                FIELDS
+            extra_fields: any other fields of the hit
+
+        Returns:
+            None
+        """
+        self.matched_text = matched_text
+        self.file_index_begin = file_index_begin
+        self.file_index_end = file_index_end
+        self.evidence_type = evidence_type
+        self.detection_method = detection_method
+        self.line_number = line_number
+        self.line_index_begin = line_index_begin
+        self.line_index_end = line_index_end
+        self.comments = comments
+        self.human_reviewed = human_reviewed
+        self.encryption_api_usage = encryption_api_usage
+        self.encryption_library = encryption_library
+        self.line_text = line_text
+        self.line_text_before_1 = line_text_before_1
+        self.line_text_before_2 = line_text_before_2
+        self.line_text_before_3 = line_text_before_3
+        self.line_text_after_1 = line_text_after_1
+        self.line_text_after_2 = line_text_after_2
+        self.line_text_after_3 = line_text_after_3
+        self.extra_fields = extra_fields or None
+
+    def __getitem__(self, field):
+        if field in Hit.FIELDS:
+            value = getattr(self, field)
+            if value is not None:
+                return value
+        elif self.extra_fields is not None and field in self.extra_fields:
+            return self.extra_fields[field]
+        raise KeyError(field)
+
+    def __setitem__(self, field, value):
+        if field in Hit.FIELDS:
+            setattr(self, field, value)
+        else:
+            if self.extra_fields is None:
+                self.extra_fields = {}
+            self.extra_fields[field] = value
+
+    def __contains__(self, field):
+        if field in Hit.FIELDS:
+            return getattr(self, field) is not None
+        return self.extra_fields is not None and field in self.extra_fields
+
+    def __eq__(self, other):
+        if isinstance(other, Hit):
+            other = other.to_dict()
+        return self.to_dict() == other
+
+    def __repr__(self):
+        return "Hit(" + repr(self.to_dict()) + ")"
+
+    def get(self, field, default=None):
+        """Get the value of a field
+
+        Args:
+            field: (string)
+            default: value to return if the hit does not have the field
+
+        Returns:
+            the value of the field, or default
+        """
+        try:
+            return self[field]
+        except KeyError:
+            return default
+
+    def copy(self):
+        """Copy the hit, so that the fields of the copy can be changed without changing it
+
+        Args:
+            None
+
+        Returns:
+            (Hit)
+        """
+        hit = Hit.__new__(Hit)
+        for field in Hit.__slots__:
+            setattr(hit, field, getattr(self, field))
+        if self.extra_fields is not None:
+            hit.extra_fields = dict(self.extra_fields)
+        return hit
+
+    def to_dict(self):
+        """Convert the hit to the dict of its output fields
+
+        Args:
+            None
+
+        Returns:
+            (dict)
+        """
+        hit = {field: value for field, value in zip(Hit.FIELDS, Hit.field_values(self)) \
+            if value is not None}
+        if self.extra_fields is not None:
+            hit.update(self.extra_fields)
+        return hit
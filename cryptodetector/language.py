@@ -12,6 +12,7 @@ under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES
 OR CONDITIONS OF ANY KIND, either express or implied.
 """
 
+import re
 from abc import ABCMeta
 
 class LanguageType(ABCMeta):
@@ -26,7 +27,9 @@ class LanguageType(ABCMeta):
 
 
 class Language(object):
-    """Defines set of supported file languages and their respective file extensions
+    """Defines set of supported file languages and their respective file extensions, the
+    interpreters named on the shebang line of their scripts, and the names of files known to be
+    written in them
     """
     class Unknown(metaclass=LanguageType):
         string_repr = "unknown"
@@ -34,6 +37,8 @@ class Language(object):
         is_binary = False
         is_source_code = False
         extensions = []
+        interpreters = []
+        filenames = []
 
     class Binary(metaclass=LanguageType):
         string_repr = "binary"
@@ -41,6 +46,8 @@ class Language(object):
         is_binary = True
         is_source_code = False
         extensions = []
+        interpreters = []
+        filenames = []
 
     class PlainText(metaclass=LanguageType):
         string_repr = "all"
@@ -48,6 +55,8 @@ class Language(object):
         is_binary = False
         is_source_code = False
         extensions = ["txt", "text", "xml", "html", "xsl", "xspf"]
+        interpreters = []
+        filenames = []
 
     class C(metaclass=LanguageType):
         string_repr = "c"
@@ -55,6 +64,8 @@ class Language(object):
         is_binary = False
         is_source_code = True
         extensions = ["c", "cc", "cp", "cpp", "c++", "cxx", "h", "hh", "hxx", "hpp", "h++", "moc"]
+        interpreters = []
+        filenames = []
 
     class Python(metaclass=LanguageType):
         string_repr = "python"
@@ -62,6 +73,8 @@ class Language(object):
         is_binary = False
         is_source_code = True
         extensions = ["py", "rpy", "pyt", "pyw", "pym", "re"]
+        interpreters = ["python", "pypy"]
+        filenames = []
 
     class Java(metaclass=LanguageType):
         string_repr = "java"
@@ -69,6 +82,8 @@ class Language(object):
         is_binary = False
         is_source_code = True
         extensions = ["java", "jsp", "j"]
+        interpreters = []
+        filenames = []
 
     class Shell(metaclass=LanguageType):
         string_repr = "shell"
@@ -76,6 +91,11 @@ class Language(object):
         is_binary = False
         is_source_code = True
         extensions = ["sh", "csh", "ksh", "run", "bsh", "bash"]
+        interpreters = ["sh", "bash", "dash", "ash", "ksh", "csh", "tcsh", "zsh"]
+        # build files whose rules or instructions are shell commands
+        filenames = ["Makefile", "makefile", "GNUmakefile", "Makefile.am", "Makefile.in", \
+            "configure", "configure.ac", "configure.in", "Dockerfile", "Containerfile", \
+            "PKGBUILD", "APKBUILD"]
 
     class Perl(metaclass=LanguageType):
         string_repr = "perl"
@@ -83,6 +103,8 @@ class Language(object):
         is_binary = False
         is_source_code = True
         extensions = ["pl"]
+        interpreters = ["perl"]
+        filenames = []
 
     class Javascript(metaclass=LanguageType):
         string_repr = "javascript"
@@ -90,6 +112,8 @@ class Language(object):
         is_binary = False
         is_source_code = True
         extensions = ["js", "javascript", "json"]
+        interpreters = ["node", "nodejs"]
+        filenames = []
 
     class Scala(metaclass=LanguageType):
         string_repr = "scala"
@@ -97,6 +121,8 @@ class Language(object):
         is_binary = False
         is_source_code = True
         extensions = ["scala"]
+        interpreters = ["scala"]
+        filenames = []
 
     class MSDOS(metaclass=LanguageType):
         string_repr = "msdos"
@@ -104,6 +130,8 @@ class Language(object):
         is_binary = False
         is_source_code = True
         extensions = ["bat"]
+        interpreters = []
+        filenames = []
 
     class Haskell(metaclass=LanguageType):
         string_repr = "haskell"
@@ -111,6 +139,8 @@ class Language(object):
         is_binary = False
         is_source_code = True
         extensions = ["hs", "lhs"]
+        interpreters = ["runhaskell", "runghc"]
+        filenames = []
 
     class PHP(metaclass=LanguageType):
         string_repr = "php"
@@ -118,6 +148,8 @@ class Language(object):
         is_binary = False
         is_source_code = True
         extensions = ["php"]
+        interpreters = ["php"]
+        filenames = []
 
     class Patch(metaclass=LanguageType):
         string_repr = "patch"
@@ -125,6 +157,8 @@ class Language(object):
         is_binary = False
         is_source_code = True
         extensions = ["patch"]
+        interpreters = []
+        filenames = []
 
     class Pascal(metaclass=LanguageType):
         string_repr = "pascal"
@@ -132,6 +166,28 @@ class Language(object):
         is_binary = False
         is_source_code = True
         extensions = ["p"]
+        interpreters = []
+        filenames = []
+
+    # magic numbers at the beginning of binary files: executables, archives, compressed files and
+    # images. The bzip2 and GIF ones are whole signatures, since a text file may well begin with
+    # "BZh" or "GIF8".
+    BINARY_MAGIC_NUMBERS = (b"\x7fELF", b"\xca\xfe\xba\xbe", b"\xcf\xfa\xed\xfe", \
+        b"\xce\xfa\xed\xfe", b"PK\x03\x04", b"\x1f\x8b", b"\xfd7zXZ\x00", \
+        b"7z\xbc\xaf\x27\x1c", b"\x89PNG", b"GIF87a", b"GIF89a", b"\xff\xd8\xff") \
+        + tuple(b"BZh" + bytes([level]) + b"1AY&SY" for level in b"123456789")
+
+    # name of the interpreter on the shebang line of a script, either a path or run by env, and
+    # without its version number
+    SHEBANG_REGEX = re.compile(rb"#![ \t]*(?:\S*/)?(?:env[ \t]+(?:-\S+[ \t]+)*)?" \
+        + rb"([^\s/]*?)[\d.]*(?:\s|$)")
+
+    # extension -> language, interpreter -> language, file name -> language and name -> language
+    # dicts, built the first time they are used
+    extension_languages = None
+    interpreter_languages = None
+    filename_languages = None
+    named_languages = None
 
     @staticmethod
     def language_list():
@@ -143,8 +199,89 @@ class Language(object):
         return [str(lang) for lang in Language.language_list() if lang.is_text]
 
     @staticmethod
-    def guess_language(file_extension):
+    def by_name(name):
+        """Find a language by its name
+
+        Args:
+            name: (string) the string representation of the language
+
+        Returns:
+            the language, or None if there is no language with that name
+        """
+        if Language.named_languages is None:
+            Language.build_lookups()
+        return Language.named_languages.get(name)
+
+    @staticmethod
+    def guess_language(file_extension, file_name=None):
+        """Guess the language of a file from its name, if it is a well-known one like Makefile,
+        or else from its extension
+
+        Args:
+            file_extension: (string) lower case extension of the file, without the dot
+            file_name: (string) name of the file, without its directory
+
+        Returns:
+            the language, or Language.Unknown if neither the name nor the extension is known
+        """
+        if Language.extension_languages is None:
+            Language.build_lookups()
+        language = Language.filename_languages.get(file_name)
+        if language is not None:
+            return language
+        return Language.extension_languages.get(file_extension, Language.Unknown)
+
+    @staticmethod
+    def sniff_language(prefix):
+        """Guess the language of a file whose extension is not known from its first bytes: the
+        magic number of a binary file, or the interpreter on the shebang line of a script. Some
+        magic numbers are text characters, so a file with one of them is only binary if its
+        first bytes also have non-text characters (see CryptoDetector.sniff_file_language).
+
+        Args:
+            prefix: (bytes) the first bytes of the file
+
+        Returns:
+            the language, or Language.Unknown if it cannot be guessed
+        """
+        if prefix.startswith(Language.BINARY_MAGIC_NUMBERS):
+            return Language.Binary
+
+        match = Language.SHEBANG_REGEX.match(prefix)
+        if match is None:
+            return Language.Unknown
+
+        if Language.interpreter_languages is None:
+            Language.build_lookups()
+        return Language.interpreter_languages.get(str(match.group(1), "ascii", "replace"), \
+            Language.Unknown)
+
+    @staticmethod
+    def build_lookups():
+        """Build the dicts that map the extensions, interpreters, file names and names of the
+        languages to them. The first language listing an extension, an interpreter or a file
+        name wins.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        extension_languages = {}
+        interpreter_languages = {}
+        filename_languages = {}
+        named_languages = {}
         for lang in Language.language_list():
-            if file_extension in lang.extensions:
-                return lang
-        return Language.Unknown
+            for extension in lang.extensions:
+                extension_languages.setdefault(extension, lang)
+            for interpreter in lang.interpreters:
+                interpreter_languages.setdefault(interpreter, lang)
+            for filename in lang.filenames:
+                filename_languages.setdefault(filename, lang)
+            named_languages.setdefault(str(lang), lang)
+
+        Language.interpreter_languages = interpreter_languages
+        Language.filename_languages = filename_languages
+        Language.named_languages = named_languages
+        Language.extension_languages = extension_languages
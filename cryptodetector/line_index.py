@@ -0,0 +1,119 @@
+"""
+Copyright (c) 2017 Wind River Systems, Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software  distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES
+OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+
+import re
+from array import array
+from bisect import bisect_right
+from itertools import accumulate
+
+class LineIndex(object):
+    """Index of the line beginnings in a text, for mapping a file index to its line number and
+    looking up the text of a line without splitting the whole content into lines. The lines are
+    only indexed once they are first looked up, so that one index can be created for every file
+    and shared by the methods searching it and the output collecting its hits.
+    """
+
+    NEW_LINE_BYTES_REGEX = re.compile(rb"\n")
+
+    def __init__(self, content):
+        """
+        Args:
+            content: (string) file content, or (bytes) the content of an ASCII text file, such
+                as a memory-mapped file
+
+        Returns:
+            None
+        """
+        self.content = content
+
+        # line_begins[n] is the file index at which line n + 1 begins; see index_lines
+        self.line_begins = None
+
+    def index_lines(self):
+        """Find the beginning of every line of the content, unless it was already done
+
+        Args:
+            None
+
+        Returns:
+            (array) of the file index at which each line begins
+        """
+        if self.line_begins is not None:
+            return self.line_begins
+
+        line_begins = array("q", [0])
+        if isinstance(self.content, str):
+            line_lengths = map(len, self.content.split("\n"))
+            line_begins.extend(accumulate(map((1).__add__, line_lengths)))
+            line_begins.pop()
+        else:
+            line_begins.extend(match.end() for match \
+                in LineIndex.NEW_LINE_BYTES_REGEX.finditer(self.content))
+
+        self.line_begins = line_begins
+        return line_begins
+
+    def line_count(self):
+        """Number of lines in the content
+
+        Args:
+            None
+
+        Returns:
+            (integer)
+        """
+        return len(self.index_lines())
+
+    def line_number(self, file_index):
+        """Find the line on which the given file index is
+
+        Args:
+            file_index: (integer)
+
+        Returns:
+            (integer) line number, starting from 1
+        """
+        return bisect_right(self.index_lines(), file_index)
+
+    def line_begin(self, line_number):
+        """File index at which the given line begins
+
+        Args:
+            line_number: (integer) starting from 1
+
+        Returns:
+            (integer)
+        """
+        return self.index_lines()[line_number - 1]
+
+    def line_text(self, line_number):
+        """Text of the given line, without the new line character
+
+        Args:
+            line_number: (integer) starting from 1
+
+        Returns:
+            (string) the line text, or an empty string if there is no such line
+        """
+        line_begins = self.index_lines()
+        if line_number < 1 or line_number > len(line_begins):
+            return ""
+        begin = line_begins[line_number - 1]
+        if line_number == len(line_begins):
+            line_text = self.content[begin:]
+        else:
+            line_text = self.content[begin:line_begins[line_number] - 1]
+        if not isinstance(line_text, str):
+            line_text = str(line_text, "ascii")
+        return line_text
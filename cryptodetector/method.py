@@ -87,3 +87,58 @@ class Method(metaclass=MethodFactory):
             (bool) whether it found any matches in the content
         """
         pass
+
+    def supports_bytes_content(self, language):
+        """Indicates whether search and quick_search accept the content of a text file in the
+        given language as a bytes-like object of its ASCII characters (such as a memory-mapped
+        file) instead of a string. The matches must be the same either way.
+
+        Args:
+            language: language of the content (see langauges.py)
+
+        Returns:
+            (bool) False, unless the method overrides it
+        """
+        return False
+
+    def search_indexed(self, content, language, line_index):
+        """Search like search, given the line index of the content, which is shared by all the
+        methods searching it and by the output collecting the hits (see LineIndex)
+
+        Args:
+            content: the content to be scanned; see search
+            language: language of the content (see langauges.py)
+            line_index: (LineIndex) of the content
+
+        Returns:
+            (list) list of matches; see search. Unless the method overrides it, this is the
+                result of search, which does not use the line index.
+        """
+        return self.search(content, language)
+
+    def max_match_length(self):
+        """Length of the longest text that a match of this method can span. A large file whose
+        lines are too long to search a few whole lines at a time is searched in chunks that
+        overlap by this length (see CryptoDetector.search_text_file_in_chunks).
+
+        Args:
+            None
+
+        Returns:
+            (integer) the length, or None if the matches are not bounded, which is the default
+        """
+        return None
+
+    def result_cache_key(self):
+        """Key of everything the matches of this method depend on, other than the content and
+        language of the file, such as its keyword list and options. The matches of a content are
+        cached between runs under this key (see ResultCache).
+
+        Args:
+            None
+
+        Returns:
+            (string) the key, or None to not cache the matches of this method, which is the
+                default
+        """
+        return None
@@ -48,23 +48,69 @@ class KeywordSearch(Method):
         """
         return language.is_text
 
+    def supports_bytes_content(self, language):
+        """This method searches bytes content with bytes patterns
+
+        Args:
+            language: (string) see langauges.py
+
+        Returns:
+            (bool)
+        """
+        return True
+
+    def max_match_length(self):
+        """Matches of this method are the keywords of its keyword list
+
+        Args:
+            None
+
+        Returns:
+            (integer) length of the longest keyword
+        """
+        return self.regex.max_match_length()
+
+    def result_cache_key(self):
+        """The matches of this method only depend on its keyword list and options
+
+        Args:
+            None
+
+        Returns:
+            (string) checksum of the keyword list and options
+        """
+        return self.regex.checksum
+
     def search(self, content, language):
         """Search file content and find all matches
 
         Args:
-            content: (string) file content
+            content: (string) file content, or (bytes) the content of an ASCII text file
             language: (string) see langauges.py
 
         Returns:
-            (list) of dict objects containing output fields
+            (list) of Hit objects containing output fields
         """
         return self.regex.search(content, language)
 
+    def search_indexed(self, content, language, line_index):
+        """Search file content and find all matches, looking up their lines in the given index
+
+        Args:
+            content: (string) file content, or (bytes) the content of an ASCII text file
+            language: (string) see langauges.py
+            line_index: (LineIndex) of the content
+
+        Returns:
+            (list) of Hit objects containing output fields
+        """
+        return self.regex.search(content, language, line_index)
+
     def quick_search(self, content, language):
         """Quickly search content for one or more matches
 
         Args:
-            content: (string) file content
+            content: (string) file content, or (bytes) the content of an ASCII text file
             language: (string) see langauges.py
 
         Returns:
@@ -44,7 +44,17 @@ class Options():
             "source_files_only": False,
             "packages": [],
             "ignore_evidence_types": [],
-            "suppress_warnings": False
+            "suppress_warnings": False,
+            "cache_directory": None,
+            "jobs": 1,
+            "package_jobs": 1,
+            "pipeline": False,
+            "stream_chunk_size": None,
+            "mmap_threshold": None,
+            "text_check_size": 64,
+            "result_cache": False,
+            "stat_cache": False,
+            "search_duplicate_contents": False
             }
 
         self.options_help = {
@@ -91,7 +101,45 @@ class Options():
 
             "log": "Create event log and error log files at the end of each run.",
 
-            "source_files_only": "Only scan source code files; ignore all other text files"
+            "source_files_only": "Only scan source code files; ignore all other text files",
+
+            "cache_directory": "Directory in which to cache the parsed keyword lists between " \
+                + "runs. Caching is disabled if it is not specified.",
+
+            "jobs": "Number of processes scanning the files of a package in parallel. The " \
+                + "output is the same as scanning them one at a time in a single process.",
+
+            "package_jobs": "Number of packages scanned concurrently, each in its own process. " \
+                + "The output file of each package is written as soon as it is scanned. The " \
+                + "files of each package are then scanned one at a time.",
+
+            "pipeline": "List and extract, read and hash, and search the files of a package in " \
+                + "separate threads connected by bounded queues, so that the stages overlap. " \
+                + "Only used when there is a single job. The depth of the queue in front of " \
+                + "each stage is written to the log.",
+
+            "stream_chunk_size": "Read files larger than this many KiB in chunks of this size, " \
+                + "instead of reading them whole into memory. The output is the same either " \
+                + "way, except that the line text of lines longer than a chunk is clamped.",
+
+            "text_check_size": "Number of KiB at the beginning of a file with an unknown " \
+                + "extension to check for non-text characters, to tell whether it is a text or " \
+                + "a binary file before decoding it.",
+
+            "mmap_threshold": "Map ASCII text files at least this many KiB large in memory, " \
+                + "and search them with bytes patterns instead of reading them into strings.",
+
+            "result_cache": "Cache the hits found in each file content in a database in the " \
+                + "cache_directory, and only search the files whose content, language, " \
+                + "keyword lists or method options changed since they were last cached.",
+
+            "stat_cache": "Also cache the SHA1 of each local file along with its size, " \
+                + "modification time and inode, and do not read the files that did not change " \
+                + "since they were last cached, unless they have hits. Requires result_cache.",
+
+            "search_duplicate_contents": "Search every file, even the ones with the same " \
+                + "content as a file already searched, and list the hits of every copy of a " \
+                + "content in the output."
         }
 
         self.cmd_flags = {
@@ -102,7 +150,8 @@ class Options():
             "verbose": "-v",
             "quick": "-q",
             "suppress_warnings": "-W",
-            "output_in_package_directory": "-p"
+            "output_in_package_directory": "-p",
+            "jobs": "-j"
         }
 
         self.method_options = {}
@@ -0,0 +1,274 @@
+"""
+Copyright (c) 2017 Wind River Systems, Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software  distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES
+OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+
+import threading
+from collections import deque
+
+class PipelineQueue(object):
+    """Queue between two stages of a pipeline, bounded both by the number of items and by their
+    total size in bytes, so that a fast stage waits for the next one instead of piling up data
+    """
+    def __init__(self, max_items, max_bytes):
+        """
+        Args:
+            max_items: (integer) maximum number of items in the queue
+            max_bytes: (integer) maximum total size of the items in the queue. A single item
+                larger than this is still let through when the queue is empty.
+
+        Returns:
+            None
+        """
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.items = deque()
+        self.bytes = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+        # queue depth statistics, sampled every time an item is added
+        self.put_count = 0
+        self.depth_sum = 0
+        self.max_depth = 0
+        self.max_queued_bytes = 0
+
+    def put(self, item, size=0):
+        """Add an item to the queue, waiting until there is room for it
+
+        Args:
+            item: the item
+            size: (integer) size of the item in bytes
+
+        Returns:
+            (bool) False if the queue was closed, in which case the item is dropped
+        """
+        with self.condition:
+            while not self.closed and self.items and (len(self.items) >= self.max_items \
+                or self.bytes + size > self.max_bytes):
+                self.condition.wait()
+            if self.closed:
+                return False
+
+            self.items.append((item, size))
+            self.bytes += size
+
+            self.put_count += 1
+            self.depth_sum += len(self.items)
+            self.max_depth = max(self.max_depth, len(self.items))
+            self.max_queued_bytes = max(self.max_queued_bytes, self.bytes)
+
+            self.condition.notify_all()
+            return True
+
+    def get(self):
+        """Remove the oldest item from the queue, waiting until there is one
+
+        Args:
+            None
+
+        Returns:
+            the item, or Pipeline.END if the queue was closed
+        """
+        with self.condition:
+            while not self.closed and not self.items:
+                self.condition.wait()
+            if self.closed:
+                return Pipeline.END
+
+            item, size = self.items.popleft()
+            self.bytes -= size
+            self.condition.notify_all()
+            return item
+
+    def close(self):
+        """Close the queue, dropping its items and waking up everyone waiting on it
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        with self.condition:
+            self.closed = True
+            self.items.clear()
+            self.bytes = 0
+            self.condition.notify_all()
+
+    def stats(self):
+        """Depth statistics of the queue
+
+        Args:
+            None
+
+        Returns:
+            (dict) with the "mean_depth" and "max_depth" of the queue at the time items were added
+                to it, and the "max_bytes" it held at once
+        """
+        with self.condition:
+            mean_depth = 0
+            if self.put_count:
+                mean_depth = self.depth_sum / self.put_count
+            return {
+                "mean_depth": mean_depth,
+                "max_depth": self.max_depth,
+                "max_bytes": self.max_queued_bytes
+            }
+
+
+class Pipeline(object):
+    """Runs each stage of a pipeline in its own thread, passing the items from one stage to the
+    next through bounded queues, so that I/O bound and CPU bound stages overlap. The items come
+    out of the pipeline in the same order as they went in.
+
+    A queue that is often full sits in front of the slowest stage, while the queues after it
+    stay mostly empty.
+    """
+
+    # marks the end of the items in a queue
+    END = object()
+
+    def __init__(self, source, stages, max_items=64, max_bytes=64 * 1024 * 1024):
+        """Start the threads of the pipeline
+
+        Args:
+            source: (iterable) of the items going into the pipeline. It is iterated in a thread
+                of its own.
+            stages: (list) of (name, function, size function) tuples. Each stage calls its
+                function on every item, and passes the result to the next stage. The size
+                function gives the size in bytes of a result, or is None if its size does not
+                matter.
+            max_items: (integer) maximum number of items waiting in front of each stage
+            max_bytes: (integer) maximum total size of the items waiting in front of each stage
+
+        Returns:
+            None
+        """
+        self.names = ["source"] + [name for name, _, _ in stages]
+        self.queues = [PipelineQueue(max_items, max_bytes) for _ in self.names]
+        self.threads = [threading.Thread(target=self.run_source, args=(source, self.queues[0]))]
+
+        for index, (_, function, size_function) in enumerate(stages):
+            self.threads.append(threading.Thread(target=self.run_stage, \
+                args=(function, size_function, self.queues[index], self.queues[index + 1])))
+
+        for thread in self.threads:
+            thread.daemon = True
+            thread.start()
+
+    @staticmethod
+    def run_source(source, output_queue):
+        """Put the items of the source in the first queue
+
+        Args:
+            source: (iterable)
+            output_queue: (PipelineQueue)
+
+        Returns:
+            None
+        """
+        try:
+            for item in source:
+                if not output_queue.put(item):
+                    return
+        except BaseException as expn:
+            output_queue.put(PipelineFailure(expn))
+            return
+        output_queue.put(Pipeline.END)
+
+    @staticmethod
+    def run_stage(function, size_function, input_queue, output_queue):
+        """Call the function of a stage on each item of its input queue, and put the results in
+        its output queue
+
+        Args:
+            function: (function)
+            size_function: (function) or None
+            input_queue: (PipelineQueue)
+            output_queue: (PipelineQueue)
+
+        Returns:
+            None
+        """
+        while True:
+            item = input_queue.get()
+            if item is Pipeline.END or isinstance(item, PipelineFailure):
+                output_queue.put(item)
+                return
+
+            try:
+                result = function(item)
+                size = 0
+                if size_function is not None:
+                    size = size_function(result)
+            except BaseException as expn:
+                output_queue.put(PipelineFailure(expn))
+                return
+
+            if not output_queue.put(result, size):
+                return
+
+    def __iter__(self):
+        """Iterate over the results of the last stage
+
+        Raises:
+            the exception raised by the source or any of the stages
+        """
+        output_queue = self.queues[-1]
+        while True:
+            item = output_queue.get()
+            if item is Pipeline.END:
+                return
+            if isinstance(item, PipelineFailure):
+                self.close()
+                raise item.exception
+            yield item
+
+    def close(self):
+        """Stop the pipeline, dropping the items still in it, and wait for its threads. The
+        stages stop after the item they are working on.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        for queue in self.queues:
+            queue.close()
+        for thread in self.threads:
+            if thread is not threading.current_thread():
+                thread.join()
+
+    def stats(self):
+        """Queue depth statistics of each stage
+
+        Args:
+            None
+
+        Returns:
+            (dict) stage name -> statistics of the queue in front of the stage (see
+                PipelineQueue.stats), for every stage after the source. The "output" entry is
+                the queue that holds the final results.
+        """
+        stage_stats = {}
+        for index, name in enumerate(self.names[1:]):
+            stage_stats[name] = self.queues[index].stats()
+        stage_stats["output"] = self.queues[-1].stats()
+        return stage_stats
+
+
+class PipelineFailure(object):
+    """Exception raised in a stage of the pipeline, passed down to be raised to its consumer"""
+    def __init__(self, exception):
+        self.exception = exception
@@ -15,13 +15,50 @@ OR CONDITIONS OF ANY KIND, either express or implied.
 import re
 import json
 import os
+import sys
+import hashlib
+import codecs
+import tempfile
 import configparser
-from cryptodetector import Language
+from cryptodetector import Language, LineIndex, Hit, Output, VERSION
 from cryptodetector.exceptions import InvalidKeywordList
 
 class Regex(object):
     """Class for searching file contents for keywords using regular expressions
     """
+
+    # directory in which parsed keyword lists are cached, or None to disable caching
+    cache_directory = None
+
+    # version of the cached keyword list format. Increase it whenever cached_data changes in a
+    # way that makes older cache files invalid.
+    CACHE_VERSION = 7
+
+    # words of the content, as delimited by the boundary (\b) character
+    TOKEN_REGEX = re.compile(r"\w+")
+
+    # words of bytes content
+    BYTES_TOKEN_REGEX = re.compile(rb"\w+")
+
+    # escaped character classes, which lower-casing a pattern would change
+    ESCAPED_UPPER_CASE_REGEX = re.compile(r"\\[A-Z]")
+
+    # characters outside of ASCII, in which ignoring case and lower-casing differ
+    NON_ASCII_REGEX = re.compile(r"[^\x00-\x7f]")
+
+    # characters that ignoring case matches to ASCII letters, but that lower-casing keeps as they
+    # are (dotless i and long s)
+    CASE_FOLDED_TO_ASCII_REGEX = re.compile("[\u0131\u017f]")
+
+    # size of the blocks of bytes content lower-cased at a time; see find_bytes_matches
+    BYTES_BLOCK_SIZE = 1024 * 1024
+
+    # keyword consisting of a single word, optionally surrounded by boundary characters
+    IDENTIFIER_REGEX = re.compile(r"(?:\\b)*\w+(?:\\b)*")
+
+    # boundary, escaped character or character of a keyword regular expression
+    KEYWORD_RE_TOKEN_REGEX = re.compile(r"\\b|\\.|.", flags=re.DOTALL)
+
     def __init__(self, ignore_case=False, ignore_evidence_types=[], whole_words=False):
         self.keywords = {}
         self.match_specs = {}
@@ -32,6 +69,24 @@ class Regex(object):
             self.flags = re.IGNORECASE
         self.ignore_evidence_types = ignore_evidence_types
         self.keyword_list_version = None
+        self.token_match_specs = None
+        self.fallback_keywords = {}
+
+        # keywords matched by the pattern of each language, the regular expression of each
+        # distinct keyword list, and the compiled pattern of each regular expression. Patterns are
+        # only built and compiled the first time a language is searched; see pattern_regex.
+        self.pattern_keywords = {}
+        self.keyword_list_regexes = {}
+        self.patterns = {}
+
+        # case-sensitive versions of the patterns of each language; see lower_pattern
+        self.lower_patterns = {}
+
+        # bytes versions of the patterns and keywords of each language; see bytes_matcher
+        self.bytes_matchers = {}
+
+        # checksum of the keyword list and the options of this object; see keyword_list_checksum
+        self.checksum = None
 
     def read_keyword_list(self, keyword_list_path):
         """reads the set of keywords defined in a config file
@@ -48,6 +103,31 @@ class Regex(object):
         if not os.path.isfile(keyword_list_path):
             raise InvalidKeywordList("Keyword list file '" + keyword_list_path + "' did not exist.")
 
+        self.checksum = self.keyword_list_checksum(keyword_list_path)
+
+        cache_path = None
+        if Regex.cache_directory:
+            cache_path = self.cache_path(self.checksum)
+            if self.load_cache(cache_path):
+                return
+
+        self.parse_keyword_list(keyword_list_path)
+
+        if cache_path:
+            self.save_cache(cache_path)
+
+    def parse_keyword_list(self, keyword_list_path):
+        """Parse the keyword list config file and compile its keywords
+
+        Args:
+            keyword_list_path: (string) path to the keyword list config file
+
+        Returns:
+            None
+
+        Raises:
+            InvalidKeywordList
+        """
         # read config file
         config = configparser.ConfigParser(allow_no_value=True, delimiters=('='))
         config.optionxform = str
@@ -75,6 +155,9 @@ class Regex(object):
         for language in languages:
             self.keywords[language] = []
 
+        # keywords that are a single whole word
+        identifiers = set()
+
         # parse keywords
         for match_spec_string in keywords:
             if match_spec_string == "keyword_list_version":
@@ -126,6 +209,11 @@ class Regex(object):
                 # removing \b character
                 keyword_no_boundary = keyword.replace("\\b", "")
 
+                # with whole words, a keyword that is a single word can only match a whole word
+                # of the content, so it can be looked up among the words of the content instead
+                if self.whole_words and Regex.IDENTIFIER_REGEX.fullmatch(keyword):
+                    identifiers.add(keyword_no_boundary)
+
                 # escape special characters
                 keyword_re_escaped = re.escape(keyword).replace("\\\\b", r"\b")
 
@@ -153,7 +241,7 @@ class Regex(object):
                 # apply 'all' to all other languages
                 if match_language == "all":
                     for language in languages:
-                        if language is not "all":
+                        if language != "all":
                             self.keywords[language].append((keyword_no_boundary, keyword_re_escaped))
 
         # Sort keywords by length and alphabetically to make search behaviour well defined
@@ -162,6 +250,539 @@ class Regex(object):
             self.keywords[language] = sorted(self.keywords[language], \
                 key=lambda t: (len(t[0]), str.lower(t[0])), reverse=True)
 
+        # whole words that are looked up by their text rather than matched with the pattern. This
+        # is only done for case-sensitive keywords, since the words are looked up as they are.
+        if self.whole_words and not self.ignore_case:
+            self.token_match_specs = {}
+            token_lookups = {}
+            for language in languages:
+                keyword_list = tuple(self.keywords[language])
+                if keyword_list not in token_lookups:
+                    token_lookups[keyword_list] = {keyword: self.match_specs[keyword.lower()] \
+                        for keyword, _ in keyword_list if keyword in identifiers}
+                self.token_match_specs[language] = token_lookups[keyword_list]
+
+        self.select_pattern_keywords()
+
+    def select_pattern_keywords(self):
+        """Select the keywords that the pattern of each language matches: all of its keywords,
+        except the whole words that are looked up by their text
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        self.pattern_keywords = {}
+        self.keyword_list_regexes = {}
+        self.patterns = {}
+
+        # languages with the same keywords look up the same whole words, so each distinct list
+        # is only selected from once
+        selected = {}
+        for language, keyword_list in self.keywords.items():
+            keyword_list = tuple(keyword_list)
+            if self.token_match_specs is not None:
+                if keyword_list not in selected:
+                    selected[keyword_list] = tuple((keyword, keyword_re) for keyword, keyword_re \
+                        in keyword_list if keyword not in self.token_match_specs[language])
+                keyword_list = selected[keyword_list]
+                self.fallback_keywords[language] = tuple(keyword for keyword, _ in keyword_list)
+            self.pattern_keywords[language] = keyword_list
+
+    def cache_path(self, checksum):
+        """Path of the cache file for the keyword list with the given checksum
+
+        Args:
+            checksum: (string) checksum of the keyword list; see keyword_list_checksum
+
+        Returns:
+            (string) path of the cache file
+        """
+        return os.path.join(Regex.cache_directory, "keyword-list-" + checksum + ".json")
+
+    def keyword_list_checksum(self, keyword_list_path):
+        """Checksum of the given keyword list, unique to its content, the options of this object,
+        and the version of the program. The matches of a content only change with it.
+
+        Args:
+            keyword_list_path: (string) path to the keyword list config file
+
+        Returns:
+            (string) hex digest
+        """
+        checksum_calculator = hashlib.sha1()
+        with open(keyword_list_path, "rb") as keyword_list_file:
+            checksum_calculator.update(keyword_list_file.read())
+        checksum_calculator.update(repr((self.ignore_case, self.whole_words, \
+            sorted(self.ignore_evidence_types), VERSION, Regex.CACHE_VERSION, \
+            sys.version_info[:2])).encode("utf-8"))
+
+        return checksum_calculator.hexdigest()
+
+    def cached_data(self):
+        """Convert the parsed keyword list to plain data, which can be saved as JSON. Most
+        languages share the exact same keywords, and all the keywords of a section share the same
+        match spec, so each distinct keyword list and match spec is only saved once, and the
+        languages and keywords refer to them by index.
+
+        Args:
+            None
+
+        Returns:
+            (dict)
+        """
+        keyword_lists = []
+        list_indices = {}
+        language_lists = {}
+        for language, keyword_list in self.keywords.items():
+            keyword_list = tuple(keyword_list)
+            if keyword_list not in list_indices:
+                list_indices[keyword_list] = len(keyword_lists)
+                keyword_lists.append(keyword_list)
+            language_lists[language] = list_indices[keyword_list]
+
+        match_specs = []
+        spec_indices = {}
+        keyword_specs = {}
+        for keyword_identifier, match_spec in self.match_specs.items():
+            if id(match_spec) not in spec_indices:
+                spec_indices[id(match_spec)] = len(match_specs)
+                match_specs.append(match_spec)
+            keyword_specs[keyword_identifier] = spec_indices[id(match_spec)]
+
+        cached = {
+            "keyword_list_version": self.keyword_list_version,
+            "keyword_lists": keyword_lists,
+            "language_lists": language_lists,
+            "match_specs": match_specs,
+            "keyword_specs": keyword_specs,
+            "token_keywords": None
+        }
+        # the match specs of whole words are the ones of their keywords, and languages with the
+        # same keywords look up the same whole words
+        if self.token_match_specs is not None:
+            cached["token_keywords"] = [None] * len(keyword_lists)
+            for language, index in language_lists.items():
+                cached["token_keywords"][index] = sorted(self.token_match_specs[language])
+        return cached
+
+    def load_cached_data(self, cached):
+        """Set the parsed keyword list from the plain data returned by cached_data
+
+        Args:
+            cached: (dict)
+
+        Returns:
+            None
+        """
+        self.keyword_list_version = cached["keyword_list_version"]
+
+        # languages with the same keywords share the same list
+        keyword_lists = [[(str(keyword), str(keyword_re)) for keyword, keyword_re \
+            in keyword_list] for keyword_list in cached["keyword_lists"]]
+        self.keywords = {language: keyword_lists[index] for language, index \
+            in cached["language_lists"].items()}
+
+        match_specs = cached["match_specs"]
+        self.match_specs = {keyword_identifier: match_specs[index] for keyword_identifier, index \
+            in cached["keyword_specs"].items()}
+
+        self.token_match_specs = None
+        if cached["token_keywords"] is not None:
+            token_lookups = [{keyword: self.match_specs[keyword.lower()] for keyword \
+                in keywords} for keywords in cached["token_keywords"]]
+            self.token_match_specs = {language: token_lookups[index] for language, index \
+                in cached["language_lists"].items()}
+        self.select_pattern_keywords()
+
+    def load_cache(self, cache_path):
+        """Load the parsed keyword list from the cache file
+
+        Args:
+            cache_path: (string)
+
+        Returns:
+            (bool) whether the cache file existed and was loaded
+        """
+        if not os.path.isfile(cache_path):
+            return False
+
+        try:
+            with open(cache_path, "r", encoding="utf-8") as cache_file:
+                self.load_cached_data(json.load(cache_file))
+        except Exception as expn:
+            Output.print_warning("Ignoring invalid keyword list cache file " + cache_path \
+                + "\n" + str(expn))
+            return False
+
+        return True
+
+    def save_cache(self, cache_path):
+        """Save the parsed keyword list in the cache file
+
+        Args:
+            cache_path: (string)
+
+        Returns:
+            None
+        """
+        # write to a temporary file first and rename it, so other processes never read a
+        # partially written cache file
+        try:
+            os.makedirs(Regex.cache_directory, exist_ok=True)
+            file_descriptor, tmp_path = tempfile.mkstemp(dir=Regex.cache_directory)
+            with os.fdopen(file_descriptor, "w", encoding="utf-8") as cache_file:
+                json.dump(self.cached_data(), cache_file, separators=(",", ":"))
+            os.replace(tmp_path, cache_path)
+        except (OSError, IOError, TypeError, ValueError) as expn:
+            Output.print_warning("Failed to write keyword list cache file " + cache_path \
+                + "\n" + str(expn))
+
+    def keywords_regex(self, keyword_list):
+        """Merge a list of keywords into one regular expression
+
+        The keywords are merged in a trie, so that the regular expression tries each common
+        prefix only once, and the characters that end keywords in the same way are merged in a
+        character class. At each node of the trie the longer keywords are tried first, which is
+        the same order as keyword_list, so the pattern finds exactly the same matches as the
+        alternation of the keywords would.
+
+        Args:
+            keyword_list: (list) of (keyword, keyword regex) tuples sorted in order of precedence
+
+        Returns:
+            (string) regular expression, or None if keyword_list is empty
+        """
+        keyword_parts = [self.keyword_parts(keyword_re) for _, keyword_re in keyword_list]
+        keyword_parts = [parts for parts in keyword_parts if parts is not None]
+        if not keyword_parts:
+            return None
+
+        # when every keyword begins with a boundary, it is checked once at the beginning of the
+        # pattern. Otherwise, each keyword beginning with a boundary checks it after it matched.
+        boundary_first = all(boundary_begin for boundary_begin, _, _ in keyword_parts)
+
+        # each node maps the next character to the child node, and None to the regular
+        # expression that has to match after the last character of a keyword ending there
+        trie = {}
+        for boundary_begin, text, boundary_end in keyword_parts:
+            suffix = ""
+            if boundary_end:
+                suffix = r"\b"
+            if boundary_begin and not boundary_first:
+                if self.is_word_character(text[0]):
+                    suffix += r"(?<!\w" + re.escape(text) + ")"
+                else:
+                    suffix += r"(?<=\w" + re.escape(text) + ")"
+            node = trie
+            for char in text:
+                node = node.setdefault(char, {})
+            node.setdefault(None, suffix)
+
+        pattern = self.trie_regex(trie)
+        if boundary_first:
+            pattern = r"\b" + pattern
+
+        return pattern
+
+    def keyword_parts(self, keyword_re):
+        """Split a keyword regular expression into the text of the keyword and whether it has a
+        boundary (\\b) before and after it. Boundaries in the middle of the keyword are
+        between two known characters, so they are either always or never satisfied.
+
+        Args:
+            keyword_re: (string) regular expression of the keyword
+
+        Returns:
+            (tuple) boundary at the beginning (bool), keyword text (string), boundary at the
+                end (bool), or None if the keyword can never match
+        """
+        chars = []
+        boundaries = set()
+        for token in Regex.KEYWORD_RE_TOKEN_REGEX.findall(keyword_re):
+            if token == r"\b":
+                boundaries.add(len(chars))
+            else:
+                chars.append(token[-1])
+        text = "".join(chars)
+
+        if not text:
+            return False, text, bool(boundaries)
+
+        for index in boundaries:
+            if 0 < index < len(text) and self.is_word_character(text[index - 1]) \
+                == self.is_word_character(text[index]):
+                return None
+
+        return 0 in boundaries, text, len(text) in boundaries
+
+    def is_word_character(self, char):
+        """Whether the character is a word character (\\w)
+
+        Args:
+            char: (string) a single character
+
+        Returns:
+            (bool)
+        """
+        return re.match(r"\w", char, flags=self.flags) is not None
+
+    def trie_regex(self, node):
+        """Regular expression matching the keywords in a trie node. Children are tried in turn
+        before the keyword ending at the node, if any, so that the longest keyword matches.
+
+        Args:
+            node: (dict) trie node; see keywords_regex
+
+        Returns:
+            (string) regular expression
+        """
+        alternatives = []
+
+        # children that only end a keyword are merged by the suffix following them
+        last_chars = {}
+        for char in sorted(key for key in node if key is not None):
+            child = node[char]
+            if len(child) == 1 and None in child:
+                last_chars.setdefault(child[None], []).append(char)
+            else:
+                alternatives.append(re.escape(char) + self.trie_regex(child))
+
+        for suffix, chars in last_chars.items():
+            if len(chars) == 1:
+                alternatives.append(re.escape(chars[0]) + suffix)
+            else:
+                alternatives.append("[" + "".join(re.escape(char) for char in chars) + "]" \
+                    + suffix)
+
+        if None in node:
+            alternatives.append(node[None])
+
+        if len(alternatives) == 1:
+            return alternatives[0]
+        return "(?:" + "|".join(alternatives) + ")"
+
+    def match_spec_of(self, matched_text, language):
+        """Find the match spec of the keyword that matched the text
+
+        Args:
+            matched_text: (string) text matched by the pattern of the language
+            language: (string) file language; see langauges.py
+
+        Returns:
+            (dict) match spec
+        """
+        match_spec = self.match_specs.get(matched_text.lower())
+        if match_spec is not None:
+            return match_spec
+
+        # ignoring case matches a few unicode characters that are not the same once lower-cased
+        for keyword, _ in self.keywords[language]:
+            if len(keyword) == len(matched_text) \
+                and re.fullmatch(re.escape(keyword), matched_text, flags=self.flags):
+                return self.match_specs[keyword.lower()]
+
+    def pattern_regex(self, language):
+        """Regular expression of the pattern of a language, built the first time it is needed.
+        Most languages share the exact same keywords, so each distinct list is only built once.
+
+        Args:
+            language: (string) file language; see langauges.py
+
+        Returns:
+            (string) regular expression, or None if the language has no keywords to match
+        """
+        keyword_list = self.pattern_keywords[language]
+        if keyword_list not in self.keyword_list_regexes:
+            self.keyword_list_regexes[keyword_list] = self.keywords_regex(keyword_list)
+        return self.keyword_list_regexes[keyword_list]
+
+    def pattern(self, language):
+        """Compiled pattern of a language, compiled the first time it is needed
+
+        Args:
+            language: (string) file language; see langauges.py
+
+        Returns:
+            (compiled pattern) or None if the language has no keywords to match
+        """
+        if language not in self.patterns:
+            regex = self.pattern_regex(language)
+            self.patterns[language] = None
+            if regex is not None:
+                self.patterns[language] = re.compile(regex, flags=self.flags)
+        return self.patterns[language]
+
+    def lower_pattern_regex(self, language):
+        """Case-sensitive version of the pattern of a language when ignoring case, which finds the
+        same matches in lower-cased content as the pattern does in the content, only faster
+
+        Args:
+            language: (string) file language; see langauges.py
+
+        Returns:
+            (string) regular expression, or None if not ignoring case, or if the pattern has
+                escaped character classes or characters outside of ASCII
+        """
+        regex = self.pattern_regex(language)
+        if not self.ignore_case or regex is None \
+            or Regex.ESCAPED_UPPER_CASE_REGEX.search(regex) is not None \
+            or Regex.NON_ASCII_REGEX.search(regex) is not None:
+            return None
+        return regex.lower()
+
+    def lower_pattern(self, language):
+        """Compiled lower_pattern_regex of a language, compiled the first time it is needed
+
+        Args:
+            language: (string) file language; see langauges.py
+
+        Returns:
+            (compiled pattern) or None; see lower_pattern_regex
+        """
+        if language not in self.lower_patterns:
+            regex = self.lower_pattern_regex(language)
+            self.lower_patterns[language] = None
+            if regex is not None:
+                self.lower_patterns[language] = re.compile(regex)
+        return self.lower_patterns[language]
+
+    def find_text_matches(self, content, language):
+        """Find the matches of the pattern of a language in string content. When ignoring case,
+        the lower-cased content is searched with the lower-cased pattern instead, unless
+        lower-casing changes the length of the content or it has characters that ignoring case
+        matches to other letters.
+
+        Args:
+            content: (string) file content
+            language: (string) file language; see langauges.py
+
+        Returns:
+            (generator) of (begin index, end index, matched text) tuples
+        """
+        lower_pattern = self.lower_pattern(language)
+        if lower_pattern is not None \
+            and Regex.CASE_FOLDED_TO_ASCII_REGEX.search(content) is None:
+            text = content.lower()
+            if len(text) == len(content):
+                for match in lower_pattern.finditer(text):
+                    yield match.start(), match.end(), content[match.start():match.end()]
+                return
+
+        for match in self.pattern(language).finditer(content):
+            yield match.start(), match.end(), match.group()
+
+    def bytes_matcher(self, language):
+        """Bytes versions of the pattern and keywords of a language, for searching the content of
+        ASCII text files without decoding it. On ASCII content, a bytes pattern matches exactly
+        the same as its string version.
+
+        Args:
+            language: (string) file language; see langauges.py
+
+        Returns:
+            (dict) with the bytes "pattern" (or None), whether it is the case-sensitive
+                lower_pattern_regex of the language to search lower-cased content with
+                ("lower_case"), and the "token_match_specs" (or None) and "fallback_keywords" of
+                the language, or None if any of its keywords is not ASCII
+        """
+        if language in self.bytes_matchers:
+            return self.bytes_matchers[language]
+
+        regex = self.pattern_regex(language)
+        try:
+            matcher = {"pattern": None, "lower_case": False, "token_match_specs": None, \
+                "fallback_keywords": ()}
+            lower_regex = self.lower_pattern_regex(language)
+            if lower_regex is not None:
+                matcher["pattern"] = re.compile(codecs.encode(lower_regex, "ascii"))
+                matcher["lower_case"] = True
+            elif regex is not None:
+                matcher["pattern"] = re.compile(codecs.encode(regex, "ascii"), flags=self.flags)
+            if self.token_match_specs is not None:
+                matcher["token_match_specs"] = {codecs.encode(keyword, "ascii"): match_spec \
+                    for keyword, match_spec in self.token_match_specs[language].items()}
+                matcher["fallback_keywords"] = tuple(codecs.encode(keyword, "ascii") \
+                    for keyword in self.fallback_keywords[language])
+        except UnicodeEncodeError:
+            matcher = None
+
+        self.bytes_matchers[language] = matcher
+        return matcher
+
+    def find_bytes_matches(self, content, matcher):
+        """Find the matches of the bytes pattern of a language in bytes content. When ignoring
+        case, the content is lower-cased a block of whole lines at a time and searched with the
+        lower-cased pattern instead, which on ASCII content finds the same matches, only faster.
+
+        Args:
+            content: (bytes) the content of an ASCII text file
+            matcher: (dict) see bytes_matcher
+
+        Returns:
+            (generator) of (begin index, end index, matched text) tuples
+        """
+        pattern = matcher["pattern"]
+        if not matcher["lower_case"]:
+            for match in pattern.finditer(content):
+                yield match.start(), match.end(), Regex.matched_text(match)
+            return
+
+        for block_begin, block in Regex.bytes_blocks(content):
+            for match in pattern.finditer(block.lower()):
+                begin = block_begin + match.start()
+                end = block_begin + match.end()
+                yield begin, end, str(content[begin:end], "ascii")
+
+    @staticmethod
+    def bytes_blocks(content):
+        """Split bytes content into blocks of whole lines. Keywords never span multiple lines,
+        so they are found in the blocks the same as in the whole content.
+
+        Args:
+            content: (bytes) the content of an ASCII text file
+
+        Returns:
+            (generator) of (block index, block) tuples
+        """
+        block_begin = 0
+        while block_begin < len(content):
+            block_end = content.find(b"\n", block_begin + Regex.BYTES_BLOCK_SIZE) + 1
+            if block_end == 0:
+                block_end = len(content)
+            yield block_begin, content[block_begin:block_end]
+            block_begin = block_end
+
+    @staticmethod
+    def matched_text(match):
+        """Text matched by a string or bytes pattern
+
+        Args:
+            match: (match object)
+
+        Returns:
+            (string)
+        """
+        matched_text = match.group()
+        if not isinstance(matched_text, str):
+            matched_text = str(matched_text, "ascii")
+        return matched_text
+
+    def max_match_length(self):
+        """Length of the longest keyword. Keywords are matched literally, so no match is longer.
+        The keywords of each language are sorted longest first.
+
+        Args:
+            None
+
+        Returns:
+            (integer)
+        """
+        return max((len(keyword_list[0][0]) for keyword_list in self.keywords.values() \
+            if keyword_list), default=0)
+
     def kwlist_version(self):
         """Get keyword list version
 
@@ -173,98 +794,184 @@ class Regex(object):
         """
         return self.keyword_list_version
 
-    def search(self, content, language):
+    def search(self, content, language, line_index=None):
         """Search file content and find all the matches
 
         Args:
-            content: (string) file content
+            content: (string) file content, or (bytes) the content of an ASCII text file
             language: (string) file language; see langauges.py
+            line_index: (LineIndex) of the content, or None to index it if there are matches
 
         Returns:
-            (list) of matches, where a match is a dict object containing all the output fields
+            (list) of matches, where a match is a Hit object containing all the output fields
         """
-        def line_text_surrounding(line_number, lines):
-            """Returns the line text at the line_number
-
-            Args:
-                line_number: (integer)
-                lines: (list) lines of text
-
-            Returns:
-                (string)
-            """
-            if line_number < 0 or line_number >= len(lines):
-                return ""
-            return lines[line_number]
-
-        # quick first pass to detect if any keyword exists
-        found = []
-        if self.ignore_case:
-            content_lower = content.lower()
-            for keyword, keyword_re in self.keywords[str(language)]:
-                if keyword in content_lower:
-                    found.append(keyword_re)
+        language = str(language)
+
+        matcher = None
+        if not isinstance(content, str):
+            matcher = self.bytes_matcher(language)
+            if matcher is None:
+                content = str(content, "ascii")
+
+        # keywords never span multiple lines, so we can search the whole content at once and
+        # only work out the lines of the matches afterwards
+        if self.token_match_specs is not None:
+            spans = self.find_token_spans(content, language, matcher)
         else:
-            for keyword, keyword_re in self.keywords[str(language)]:
-                if keyword in content:
-                    found.append(keyword_re)
+            if matcher is None:
+                has_pattern = self.pattern_regex(language) is not None
+            else:
+                has_pattern = matcher["pattern"] is not None
+            if not has_pattern:
+                return []
+            if matcher is None:
+                matches = self.find_text_matches(content, language)
+            else:
+                matches = self.find_bytes_matches(content, matcher)
+            spans = [(begin, end, self.match_spec_of(matched_text, language)) \
+                for begin, end, matched_text in matches]
 
-        if not found:
+        if not spans:
             return []
 
-        # make a regular expression of found items to find all their occurances
-        found_regex = ""
-        for found_keyword in found:
-            found_regex += "(?:" + found_keyword + ")|"
+        # the surrounding lines of text are only looked up when the output is written (see
+        # CryptoOutput.add_hit)
+        if line_index is None:
+            line_index = LineIndex(content)
+
+        # output fields of each match spec, which are the same for all of its matches
+        spec_fields = {}
 
-        # search line by line
         result = []
-        line_number = 0
-        chars_searched = 0
-        lines = content.split("\n")
-        for line in lines:
-            for match in re.finditer(found_regex[:-1], line, flags=self.flags):
-                match_dict = {
-                    "matched_text": line[match.start(): match.end()],
-                    "line_text": line,
-                    "line_number": line_number + 1,
-                    "file_index_begin": chars_searched + match.start(),
-                    "file_index_end": chars_searched + match.end(),
-                    "line_index_begin": match.start(),
-                    "line_index_end": match.end(),
-                    "line_text_before_1": line_text_surrounding(line_number - 1, lines),
-                    "line_text_before_2": line_text_surrounding(line_number - 2, lines),
-                    "line_text_before_3": line_text_surrounding(line_number - 3, lines),
-                    "line_text_after_1": line_text_surrounding(line_number + 1, lines),
-                    "line_text_after_2": line_text_surrounding(line_number + 2, lines),
-                    "line_text_after_3": line_text_surrounding(line_number + 3, lines)
-                    }
-
-                match_spec = self.match_specs[match_dict["matched_text"].lower()]
-                for key in match_spec:
-                    if key != "language":
-                        match_dict[key] = match_spec[key]
-
-                result.append(match_dict)
-
-            chars_searched += len(line) + 1
-            line_number += 1
+        for begin, end, match_spec in spans:
+            fields = spec_fields.get(id(match_spec))
+            if fields is None:
+                fields = {key: value for key, value in match_spec.items() if key != "language"}
+                spec_fields[id(match_spec)] = fields
+
+            line_number = line_index.line_number(begin)
+            line_begin = line_index.line_begin(line_number)
+            matched_text = content[begin:end]
+            if matcher is not None:
+                matched_text = str(matched_text, "ascii")
+            result.append(Hit(
+                matched_text=matched_text,
+                line_number=line_number,
+                file_index_begin=begin,
+                file_index_end=end,
+                line_index_begin=begin - line_begin,
+                line_index_end=end - line_begin,
+                **fields))
 
         return result
 
+    def find_token_spans(self, content, language, matcher=None):
+        """Find the keywords in file content by looking up each word of the content among the
+        keywords that are a single word, and matching the pattern for the rest of them. The
+        lookup takes the same time no matter how many keywords there are.
+
+        Args:
+            content: (string) file content, or (bytes) the content of an ASCII text file
+            language: (string) file language; see langauges.py
+            matcher: (dict) bytes matcher of the language for bytes content; see bytes_matcher
+
+        Returns:
+            (list) of (begin index, end index, match spec) tuples sorted by begin index, with the
+                same non-overlapping matches that the pattern of all the keywords would find
+        """
+        if matcher is None:
+            token_regex = Regex.TOKEN_REGEX
+            token_match_specs = self.token_match_specs[language]
+            pattern = None
+            fallback_keywords = self.fallback_keywords[language]
+        else:
+            token_regex = Regex.BYTES_TOKEN_REGEX
+            token_match_specs = matcher["token_match_specs"]
+            pattern = matcher["pattern"]
+            fallback_keywords = matcher["fallback_keywords"]
+
+        # quick first pass: most files contain none of the words and none of the other keywords.
+        # Bytes content is looked up a block at a time to not hold all of its words at once.
+        if matcher is None:
+            has_tokens = not token_match_specs.keys().isdisjoint(token_regex.findall(content))
+        else:
+            has_tokens = any(not token_match_specs.keys().isdisjoint(token_regex.findall(block)) \
+                for _, block in Regex.bytes_blocks(content))
+        has_others = any(content.find(keyword) != -1 for keyword in fallback_keywords)
+        if has_others and matcher is None:
+            pattern = self.pattern(language)
+        has_others = has_others and pattern is not None
+        if not has_tokens and not has_others:
+            return []
+
+        token_spans = []
+        if has_tokens:
+            for match in token_regex.finditer(content):
+                match_spec = token_match_specs.get(match.group())
+                if match_spec is not None:
+                    token_spans.append((match.start(), match.end(), match_spec))
+
+        if not has_others:
+            return token_spans
+
+        # merge with the pattern matches, scanning from left to right and preferring the longest
+        # match among the ones beginning at the same index. The pattern is searched again from the
+        # end of the previous match whenever its next match overlaps it.
+        spans = []
+        search_from = 0
+        match = pattern.search(content)
+        for begin, end, match_spec in token_spans:
+            while match is not None and (match.start(), -match.end()) < (begin, -end):
+                spans.append((match.start(), match.end(), \
+                    self.match_spec_of(Regex.matched_text(match), language)))
+                search_from = match.end()
+                match = pattern.search(content, search_from)
+            if begin < search_from:
+                continue
+            spans.append((begin, end, match_spec))
+            search_from = end
+            if match is not None and match.start() < search_from:
+                match = pattern.search(content, search_from)
+
+        while match is not None:
+            spans.append((match.start(), match.end(), \
+                self.match_spec_of(Regex.matched_text(match), language)))
+            match = pattern.search(content, match.end())
+
+        return spans
+
     def quick_search(self, content, language):
         """Quickly search content for one or more matches
 
         Args:
-            content: (string) file content
+            content: (string) file content, or (bytes) the content of an ASCII text file
             language: (string) see langauges.py
 
         Returns:
             (bool) True if it found any matches in content, False otherwise
         """
-        for keyword in self.keywords[str(language)]:
-            if keyword in content:
-                # search again with re to account for boundary (\b) character
-                if re.search(self.keywords[str(language)][keyword], content, flags=self.flags) != None:
+        language = str(language)
+
+        if not isinstance(content, str):
+            matcher = self.bytes_matcher(language)
+            if matcher is None:
+                content = str(content, "ascii")
+            else:
+                token_match_specs = matcher["token_match_specs"]
+                if token_match_specs is not None and any(not token_match_specs.keys().isdisjoint( \
+                    Regex.BYTES_TOKEN_REGEX.findall(block)) \
+                    for _, block in Regex.bytes_blocks(content)):
                     return True
-        return False
+                return matcher["pattern"] is not None \
+                    and any(True for _ in self.find_bytes_matches(content, matcher))
+
+        if self.token_match_specs is not None:
+            if not self.token_match_specs[language].keys().isdisjoint( \
+                Regex.TOKEN_REGEX.findall(content)):
+                return True
+            pattern = self.pattern(language)
+            return pattern is not None and pattern.search(content) is not None
+
+        return self.pattern_regex(language) is not None \
+            and any(True for _ in self.find_text_matches(content, language))
+
@@ -0,0 +1,322 @@
+"""
+Copyright (c) 2017 Wind River Systems, Inc.
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at:
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software  distributed
+under the License is distributed on an "AS IS" BASIS, WITHOUT WARRANTIES
+OR CONDITIONS OF ANY KIND, either express or implied.
+"""
+
+import os
+import json
+import sqlite3
+import threading
+from cryptodetector import Hit, Output, CryptoOutput
+
+class ResultCache(object):
+    """Cache of the hits each method found in each file content, kept in an SQLite database
+    between runs, so that rescanning a new release of a package only searches the files that
+    changed. The hits of a content are looked up by its SHA1 and language, and the key of the
+    method (see Method.result_cache_key), and an empty list of hits is cached as well.
+
+    The database also keeps the SHA1, language and size of local files, looked up by their path
+    and metadata and by the settings they were read with, so that the files which did not change
+    are not even read.
+    """
+
+    # name of the database file in the cache directory. Change it whenever the format of the
+    # cached hits changes in a way that makes older databases invalid.
+    FILE_NAME = "search-results-3.sqlite"
+
+    # number of cached rows written to the database in a single transaction; see flush
+    BATCH_SIZE = 1000
+
+    def __init__(self, cache_directory):
+        """
+        Args:
+            cache_directory: (string) directory in which to keep the database
+
+        Returns:
+            None
+        """
+        self.path = os.path.join(cache_directory, ResultCache.FILE_NAME)
+        self.connection = None
+        self.disabled = False
+
+        # process that opened the connection, which cannot be shared with a forked process
+        self.connection_pid = None
+
+        # the threads of the pipeline scanning a package (see CryptoDetector.scan_files) share
+        # the connection and the rows not written yet, and use them one at a time
+        self.lock = threading.Lock()
+
+        # rows cached since they were last written to the database, by their primary key; see
+        # flush
+        self.pending_hits = {}
+        self.pending_files = {}
+
+    def __getstate__(self):
+        """The connection to the database and the rows not written yet are not sent to other
+        processes, which open their own
+        """
+        state = dict(self.__dict__)
+        state["connection"] = None
+        state["connection_pid"] = None
+        state["lock"] = None
+        state["pending_hits"] = {}
+        state["pending_files"] = {}
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def connect(self):
+        """Open the database of this process, creating it if it did not exist
+
+        Args:
+            None
+
+        Returns:
+            (sqlite3.Connection) or None if the database cannot be used
+
+        """
+        if self.disabled:
+            return None
+
+        if self.connection is not None and self.connection_pid == os.getpid():
+            return self.connection
+
+        # the rows of the process this one was forked from are written by that process
+        self.pending_hits = {}
+        self.pending_files = {}
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+            # the connection is used by several threads, one at a time under the lock
+            self.connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False)
+            self.connection_pid = os.getpid()
+
+            # several processes can read while one writes, and a crash can at worst lose the
+            # last few results
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS hits (sha1 TEXT, " \
+                + "language TEXT, method_key TEXT, hits TEXT, " \
+                + "PRIMARY KEY (sha1, language, method_key))")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, " \
+                + "size INTEGER, mtime_ns INTEGER, inode INTEGER, settings TEXT, sha1 TEXT, " \
+                + "language TEXT, " \
+                + "text_bytes INTEGER, binary_bytes INTEGER, lines_of_text INTEGER)")
+            self.connection.commit()
+
+        except (OSError, sqlite3.Error) as expn:
+            self.disable(expn)
+
+        return self.connection
+
+    def disable(self, expn):
+        """Stop using the database after an error
+
+        Args:
+            expn: (Exception)
+
+        Returns:
+            None
+        """
+        Output.print_warning("Not using the search result cache " + self.path \
+            + "\n" + str(expn))
+        self.disabled = True
+        self.connection = None
+        self.pending_hits = {}
+        self.pending_files = {}
+
+    def get(self, sha1, language, method_key):
+        """Look up the hits of a method in a content
+
+        Args:
+            sha1: (string) SHA1 of the content
+            language: (string) language of the content; see langauges.py
+            method_key: (string) method id and key; see Method.result_cache_key
+
+        Returns:
+            (list) of Hit objects, without their line text, or None if they were not cached
+        """
+        with self.lock:
+            connection = self.connect()
+            if connection is None:
+                return None
+
+            hits = self.pending_hits.get((sha1, language, method_key))
+            if hits is None:
+                try:
+                    row = connection.execute("SELECT hits FROM hits WHERE sha1 = ? " \
+                        + "AND language = ? AND method_key = ?", \
+                        (sha1, language, method_key)).fetchone()
+                except sqlite3.Error as expn:
+                    self.disable(expn)
+                    return None
+
+                if row is None:
+                    return None
+                hits = row[0]
+
+        return [Hit(**hit) for hit in json.loads(hits)]
+
+    def put(self, sha1, language, method_hits):
+        """Cache the hits of one or more methods in a content. They are written to the database
+        along with other rows; see flush
+
+        Args:
+            sha1: (string) SHA1 of the content
+            language: (string) language of the content; see langauges.py
+            method_hits: (list) of (method key, list of Hit objects) tuples
+
+        Returns:
+            None
+        """
+        # the line text is filled from the content of the file whenever the hits are used
+        rows = {}
+        for method_key, hits in method_hits:
+            hit_dicts = []
+            for hit in hits:
+                hit_dict = hit.to_dict()
+                for field in CryptoOutput.LINE_TEXT_FIELDS:
+                    hit_dict.pop(field, None)
+                hit_dicts.append(hit_dict)
+            rows[(sha1, language, method_key)] = json.dumps(hit_dicts)
+
+        with self.lock:
+            if self.connect() is None:
+                return
+            self.pending_hits.update(rows)
+            if len(self.pending_hits) + len(self.pending_files) >= ResultCache.BATCH_SIZE:
+                self.write_pending_rows()
+
+    def get_file(self, path, file_stat, settings):
+        """Look up a local file whose metadata did not change since it was last scanned with the
+        same settings
+
+        Args:
+            path: (string) absolute path of the file
+            file_stat: (os.stat_result) current metadata of the file
+            settings: (string) everything else the cached fields depend on; see
+                CryptoDetector.file_cache_settings
+
+        Returns:
+            (dict) with the "sha1", "language", "text_bytes", "binary_bytes" and
+                "lines_of_text" of the file, or None if it is not cached with the same size,
+                modification time, inode and settings
+        """
+        with self.lock:
+            connection = self.connect()
+            if connection is None:
+                return None
+
+            row = self.pending_files.get(path)
+            if row is not None:
+                if row[1:5] != (file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino, \
+                    settings):
+                    return None
+                row = row[5:]
+            else:
+                try:
+                    row = connection.execute("SELECT sha1, language, text_bytes, " \
+                        + "binary_bytes, lines_of_text FROM files WHERE path = ? AND size = ? " \
+                        + "AND mtime_ns = ? AND inode = ? AND settings = ?", (path, \
+                        file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino, \
+                        settings)).fetchone()
+                except sqlite3.Error as expn:
+                    self.disable(expn)
+                    return None
+
+        if row is None:
+            return None
+        return dict(zip(["sha1", "language", "text_bytes", "binary_bytes", "lines_of_text"], \
+            row))
+
+    def put_file(self, path, file_stat, settings, file_result):
+        """Cache the SHA1, language and size of a local file. It is written to the database
+        along with other rows; see flush
+
+        Args:
+            path: (string) absolute path of the file
+            file_stat: (os.stat_result) metadata of the file taken before it was read
+            settings: (string) the settings the file was read with; see get_file
+            file_result: (dict) the scan result of the file; see CryptoDetector.scan_file
+
+        Returns:
+            None
+        """
+        row = (path, file_stat.st_size, file_stat.st_mtime_ns, file_stat.st_ino, settings, \
+            file_result["sha1"], str(file_result["language"]), file_result["text_bytes"], \
+            file_result["binary_bytes"], file_result["lines_of_text"])
+
+        with self.lock:
+            if self.connect() is None:
+                return
+            self.pending_files[path] = row
+            if len(self.pending_hits) + len(self.pending_files) >= ResultCache.BATCH_SIZE:
+                self.write_pending_rows()
+
+    def flush(self):
+        """Write the rows cached since the last flush to the database in a single transaction.
+        Committing every row on its own would make the database sync its journal for each file.
+        Rows are flushed once BATCH_SIZE of them are pending, and whenever a package is done.
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        with self.lock:
+            if self.connection is not None and self.connection_pid == os.getpid():
+                self.write_pending_rows()
+
+    def write_pending_rows(self):
+        """Write the pending rows to the database of this process, while holding the lock
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        if not self.pending_hits and not self.pending_files:
+            return
+
+        try:
+            with self.connection:
+                self.connection.executemany("INSERT OR REPLACE INTO hits VALUES (?, ?, ?, ?)", \
+                    [key + (hits,) for key, hits in self.pending_hits.items()])
+                self.connection.executemany("INSERT OR REPLACE INTO files VALUES " \
+                    + "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", list(self.pending_files.values()))
+        except sqlite3.Error as expn:
+            self.disable(expn)
+            return
+
+        self.pending_hits = {}
+        self.pending_files = {}
+
+    def close(self):
+        """Write the pending rows and close the database of this process
+
+        Args:
+            None
+
+        Returns:
+            None
+        """
+        self.flush()
+        with self.lock:
+            if self.connection is not None and self.connection_pid == os.getpid():
+                self.connection.close()
+            self.connection = None
+            self.connection_pid = None
@@ -13,11 +13,20 @@ OR CONDITIONS OF ANY KIND, either express or implied.
 """
 
 import os
+import re
+import json
 import time
 import hashlib
 import codecs
-from unittest import TestCase
-from cryptodetector import Options, CryptoDetector, MethodFactory
+import shutil
+import tempfile
+import sqlite3
+import threading
+from unittest import TestCase, mock
+from cryptodetector import Options, CryptoDetector, MethodFactory, \
+    LineIndex, Regex, Hit, CryptoOutput, Language, FileLister, Pipeline, PipelineQueue, \
+    ResultCache, VERSION
+from cryptodetector.exceptions import InvalidMethodException, InvalidOptionsException
 
 class TestCryptoDetector(TestCase):
     """Unit Tests
@@ -31,7 +40,9 @@ class TestCryptoDetector(TestCase):
                 return mc
 
     def scan_package(self, test_packages, extra_options={}, keyword_ignore_case=True):
+        return self.make_detector(test_packages, extra_options, keyword_ignore_case).scan()
 
+    def make_detector(self, test_packages, extra_options={}, keyword_ignore_case=True):
         options = Options()._get_options()
         for option in extra_options:
             options[option] = extra_options[option]
@@ -50,13 +61,40 @@ class TestCryptoDetector(TestCase):
         self.method("api").options["kwlist_path"] = os.path.join(current_directory, \
             "test_api_list.conf")
 
-        return CryptoDetector(options, skip_output=True).scan()
+        return CryptoDetector(options, skip_output=True)
+
+    def assert_same_result(self, packages, options, extra_options={}, keyword_ignore_case=True):
+        changed_options = dict(extra_options)
+        changed_options.update(options)
+        self.assertEqual(self.scan_package(packages, changed_options, keyword_ignore_case), \
+            self.scan_package(packages, extra_options, keyword_ignore_case))
+
+    def make_package(self, files):
+        current_directory = os.path.dirname(os.path.abspath(__file__))
+        package_path = tempfile.mkdtemp(dir=current_directory)
+        self.addCleanup(shutil.rmtree, package_path)
+        for file_name, content in files.items():
+            with open(os.path.join(package_path, file_name), "wb") as package_file:
+                package_file.write(content)
+        return os.path.basename(package_path)
+
+    def make_cache_directory(self):
+        cache_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_directory, ignore_errors=True)
+
+        # scanning with a cache directory sets the one of Regex, which is restored after the test
+        patcher = mock.patch.object(Regex, "cache_directory", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return cache_directory
+
+    def fail_search(self):
+        return mock.patch.object(Regex, "search", \
+            side_effect=AssertionError("searched a cached content"))
 
     def sha1(self, file_full_path):
-        with open(file_full_path) as f:
-            checksum_calculator = hashlib.sha1()
-            checksum_calculator.update(codecs.encode(f.read(), "utf-8"))
-            return checksum_calculator.hexdigest()
+        with open(file_full_path, "rb") as f:
+            return hashlib.sha1(f.read()).hexdigest()
 
     def count_matches(self, data, package, file, evidence_type, package_name=None, known_sha1=None):
         current_directory = os.path.dirname(os.path.abspath(__file__))
@@ -174,12 +212,21 @@ class TestCryptoDetector(TestCase):
 
     def test_extract_recursive_archives(self):
         result = self.scan_package(["extract_test/recursive.zip"], \
-            {"methods": ["keyword"]})
+            {"methods": ["keyword"], "search_duplicate_contents": True})
         self.assert_result_not_empty(result, "recursive.zip")
         self.assertEqual(self.count_matches(result, "extract_test/recursive.zip/test.gz", \
             "test", "keyword_boundary_all", "recursive.zip", \
             known_sha1=self.KNOWN_TEST_SHA1), 120)
 
+    def test_extract_recursive_duplicates(self):
+        # the three copies of the file are only searched once, and their hits are only added once
+        result = self.scan_package(["extract_test/recursive.zip"], {"methods": ["keyword"]})
+        self.assertEqual(self.count_matches(result, "extract_test/recursive.zip/test.gz", \
+            "test", "keyword_boundary_all", "recursive.zip", \
+            known_sha1=self.KNOWN_TEST_SHA1), 40)
+        self.assertEqual(len(result["recursive.zip"]["crypto_evidence"][self.KNOWN_TEST_SHA1] \
+            ["file_paths"]), 3)
+
     def test_ignore_evidence_types(self):
         result = self.scan_package(["testpkg1"], {"methods": ["keyword"], \
             "ignore_evidence_types": ["keyword_any", "keyword_boundary_end"]})
@@ -202,6 +249,16 @@ class TestCryptoDetector(TestCase):
         self.assert_result_not_empty(result, "testpkg1")
         self.assertEqual(len(result["testpkg1"]["crypto_evidence"]), 1)
 
+    def test_file_count(self):
+        # the files left after stopping early are counted too
+        package_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "testpkg1")
+        for extra_options in [{}, {"quick": True}, {"stop_after": 1}, \
+            {"quick": True, "pipeline": True}, {"quick": True, "jobs": 2}]:
+            crypto_detector = self.make_detector(["testpkg1"], extra_options)
+            for package in crypto_detector.file_lister.get_package_filelist(package_path):
+                self.assertEqual(crypto_detector.scan_package(package)["stats"]["file_count"], 2)
+            crypto_detector.close_pool()
+
     def test_source_files_only(self):
         result = self.scan_package(["testpkg1"], {"methods": ["keyword"], "source_files_only": True})
         self.assert_result_not_empty(result, "testpkg1")
@@ -280,3 +337,730 @@ class TestCryptoDetector(TestCase):
 
             elif match["evidence_type"] == "keyword_boundary_end":
                 self.assertEqual(match["matched_text"], "dolor")
+
+    def test_line_index_lookup(self):
+        line_index = LineIndex("first\nsecond\n\nfourth")
+        self.assertEqual(line_index.line_count(), 4)
+        self.assertEqual(line_index.line_number(0), 1)
+        self.assertEqual(line_index.line_number(5), 1)
+        self.assertEqual(line_index.line_number(6), 2)
+        self.assertEqual(line_index.line_number(14), 4)
+        self.assertEqual(line_index.line_begin(4), 14)
+        self.assertEqual(line_index.line_text(2), "second")
+        self.assertEqual(line_index.line_text(3), "")
+        self.assertEqual(line_index.line_text(4), "fourth")
+        self.assertEqual(line_index.line_text(0), "")
+        self.assertEqual(line_index.line_text(5), "")
+
+    def test_quick_scan(self):
+        packages = ["testpkg1", "testpkg2", "testpkg3", "testpkg4"]
+        for methods in [["keyword"], ["api"], ["keyword", "api"]]:
+            for keyword_ignore_case in [True, False]:
+                full_result = self.scan_package(packages, {"methods": methods}, \
+                    keyword_ignore_case)
+                quick_result = self.scan_package(packages, {"methods": methods, "quick": True}, \
+                    keyword_ignore_case)
+                for package in packages:
+                    self.assertEqual(quick_result[package], \
+                        full_result[package]["crypto_evidence"] != {})
+
+        # keywords in testpkg4 never fall on word boundaries
+        self.assertFalse(self.scan_package(["testpkg4"], {"quick": True})["testpkg4"])
+
+    def test_keyword_list_cache(self):
+        current_directory = os.path.dirname(os.path.abspath(__file__))
+        keyword_list_path = os.path.join(current_directory, "test_keyword_list.conf")
+        cache_directory = self.make_cache_directory()
+        with mock.patch.object(Regex, "cache_directory", cache_directory):
+            regex = Regex(ignore_case=True)
+            regex.read_keyword_list(keyword_list_path)
+            self.assertEqual(len(os.listdir(cache_directory)), 1)
+
+            # the cache file holds plain JSON data, with the keywords that every language shares
+            # saved once
+            cache_path = regex.cache_path(regex.checksum)
+            with open(cache_path, encoding="utf-8") as cache_file:
+                cached_data = json.load(cache_file)
+            self.assertEqual(cached_data, json.loads(json.dumps(regex.cached_data())))
+            self.assertEqual(len(cached_data["keyword_lists"]), 1)
+            self.assertEqual(len(cached_data["match_specs"]), 4)
+
+            cached_regex = Regex(ignore_case=True)
+            self.assertTrue(cached_regex.load_cache(cache_path))
+            self.assertEqual(cached_regex.keywords, regex.keywords)
+            self.assertEqual(cached_regex.kwlist_version(), "1")
+            self.assertEqual(len(cached_regex.search("lorem IPSUM", "all")), 2)
+
+            # different options are cached separately
+            Regex(ignore_case=False).read_keyword_list(keyword_list_path)
+            self.assertEqual(len(os.listdir(cache_directory)), 2)
+
+    def test_keyword_list_cache_whole_words(self):
+        current_directory = os.path.dirname(os.path.abspath(__file__))
+        keyword_list_path = os.path.join(current_directory, "test_keyword_list.conf")
+        with mock.patch.object(Regex, "cache_directory", self.make_cache_directory()):
+            regex = Regex(whole_words=True)
+            regex.read_keyword_list(keyword_list_path)
+            cached_regex = Regex(whole_words=True)
+            self.assertTrue(cached_regex.load_cache(cached_regex.cache_path(regex.checksum)))
+            self.assertEqual(cached_regex.token_match_specs, regex.token_match_specs)
+            self.assertEqual(cached_regex.search("lorem ipsum", "all"), \
+                regex.search("lorem ipsum", "all"))
+
+    def test_result_cache(self):
+        packages = ["testpkg1", "testpkg3", "extract_test"]
+        cache_options = {"cache_directory": self.make_cache_directory(), "result_cache": True}
+        result = self.scan_package(packages, cache_options)
+        self.assertEqual(result, self.scan_package(packages))
+
+        # the second time, every file is found in the cache
+        with self.fail_search():
+            self.assertEqual(self.scan_package(packages, cache_options), result)
+            cache_options["quick"] = True
+            self.assertEqual(self.scan_package(packages, cache_options), \
+                {package: bool(result[package]["crypto_evidence"]) for package in result})
+
+    def test_result_cache_keyword_lists(self):
+        # the cached hits of one keyword list are not used for another
+        packages = ["testpkg1", "testpkg3", "extract_test"]
+        cache_options = {"cache_directory": self.make_cache_directory(), "result_cache": True}
+        self.scan_package(packages, cache_options)
+        self.assert_same_result(packages, cache_options, keyword_ignore_case=False)
+
+    def test_result_cache_requires_cache_directory(self):
+        with self.assertRaises(InvalidOptionsException):
+            self.scan_package(["testpkg1"], {"result_cache": True})
+
+    def test_result_cache_batches(self):
+        # rows are written in batches, and found before they are written
+        cache_directory = self.make_cache_directory()
+        result_cache = ResultCache(cache_directory)
+        self.addCleanup(result_cache.close)
+        hit = Hit(matched_text="aes", file_index_begin=0, file_index_end=3, \
+            evidence_type="keyword", line_number=1, line_text="aes")
+        result_cache.put("sha1", "c", [("keyword:1", [hit])])
+        self.assertEqual(self.cached_row_counts(cache_directory), [0, 0])
+        self.assertEqual(result_cache.get("sha1", "c", "keyword:1")[0]["matched_text"], "aes")
+        result_cache.flush()
+        self.assertEqual(self.cached_row_counts(cache_directory), [1, 0])
+
+    def test_result_cache_threads(self):
+        # threads share the connection
+        cache_directory = self.make_cache_directory()
+        result_cache = ResultCache(cache_directory)
+        def put_and_get(thread_index):
+            for index in range(100):
+                sha1 = str(thread_index) + "-" + str(index)
+                result_cache.put(sha1, "c", [("keyword:1", [])])
+                self.assertEqual(result_cache.get(sha1, "c", "keyword:1"), [])
+        with mock.patch.object(ResultCache, "BATCH_SIZE", 7):
+            threads = [threading.Thread(target=put_and_get, args=(thread_index,)) \
+                for thread_index in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            result_cache.close()
+        self.assertEqual(self.cached_row_counts(cache_directory), [800, 0])
+
+    def test_result_cache_workers(self):
+        # the rows cached by worker processes are written when they exit
+        packages = ["testpkg1", "testpkg3", "extract_test"]
+        cache_directory = self.make_cache_directory()
+        row_counts = None
+        for extra_options in [{}, {"jobs": 2}, {"package_jobs": 2}, {"pipeline": True}]:
+            shutil.rmtree(cache_directory, ignore_errors=True)
+            cache_options = {"cache_directory": cache_directory, "result_cache": True, \
+                "stat_cache": True}
+            cache_options.update(extra_options)
+            result = self.scan_package(packages, cache_options)
+            if row_counts is None:
+                row_counts = self.cached_row_counts(cache_directory)
+                self.assertTrue(all(row_counts))
+            self.assertEqual(self.cached_row_counts(cache_directory), row_counts)
+            with self.fail_search():
+                self.assertEqual(self.scan_package(packages, cache_options), result)
+
+    def cached_row_counts(self, cache_directory):
+        database = sqlite3.connect(os.path.join(cache_directory, ResultCache.FILE_NAME))
+        try:
+            return [database.execute("SELECT COUNT(*) FROM " + table).fetchone()[0] \
+                for table in ["hits", "files"]]
+        finally:
+            database.close()
+
+    def stat_cache_package(self):
+        package = self.make_package({"plain.txt": b"nothing to see here\n"})
+        package_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), package)
+        test_package_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "testpkg1")
+        for file_name in os.listdir(test_package_path):
+            shutil.copy(os.path.join(test_package_path, file_name), package_path)
+        cache_options = {"cache_directory": self.make_cache_directory(), \
+            "result_cache": True, "stat_cache": True}
+        result = self.scan_package([package], cache_options)
+        self.assertEqual(result, self.scan_package([package]))
+        return package, os.path.join(package_path, "plain.txt"), cache_options, result
+
+    def read_paths(self, read_file):
+        return [path for _, path in (call[0] for call in read_file.call_args_list)]
+
+    def test_stat_cache(self):
+        # the second time, only the files with hits are read, for the line text of the hits
+        package, plain_file, cache_options, result = self.stat_cache_package()
+        with mock.patch.object(CryptoDetector, "read_file", autospec=True, \
+            side_effect=CryptoDetector.read_file) as read_file:
+            self.assertEqual(self.scan_package([package], cache_options), result)
+        self.assertNotIn(plain_file, self.read_paths(read_file))
+        self.assertTrue(read_file.called)
+
+    def test_stat_cache_quick(self):
+        package, plain_file, cache_options, result = self.stat_cache_package()
+        cache_options["quick"] = True
+        with mock.patch.object(CryptoDetector, "read_file") as read_file:
+            self.assertEqual(self.scan_package([package], cache_options), {package: True})
+        self.assertFalse(read_file.called)
+
+    def test_stat_cache_changed_file(self):
+        package, plain_file, cache_options, result = self.stat_cache_package()
+        with open(plain_file, "w") as changed_file:
+            changed_file.write("AES and nothing else\n")
+        with mock.patch.object(CryptoDetector, "read_file", autospec=True, \
+            side_effect=CryptoDetector.read_file) as read_file:
+            self.assert_same_result([package], cache_options)
+        self.assertIn(plain_file, self.read_paths(read_file))
+
+    def test_stat_cache_settings(self):
+        # files cached with other settings or by another version are read again
+        package, plain_file, cache_options, result = self.stat_cache_package()
+        cache_options["text_check_size"] = 128
+        for version in [VERSION, "other version"]:
+            with mock.patch("cryptodetector.cryptodetector.VERSION", version), \
+                mock.patch.object(CryptoDetector, "read_file", autospec=True, \
+                side_effect=CryptoDetector.read_file) as read_file:
+                self.assertEqual(self.scan_package([package], cache_options), result)
+            self.assertIn(plain_file, self.read_paths(read_file))
+
+    def test_stat_cache_requires_result_cache(self):
+        with self.assertRaises(InvalidOptionsException):
+            self.scan_package(["testpkg1"], {"cache_directory": self.make_cache_directory(), \
+                "stat_cache": True})
+
+    def test_token_lookup(self):
+        keyword_list_path = os.path.join(tempfile.mkdtemp(), "token_list.conf")
+        try:
+            with open(keyword_list_path, "w") as keyword_list:
+                keyword_list.write("[keyword_list_version]\n\t1\n\n" \
+                    + "[{\"evidence_type\": \"function_usage\", \"language\": \"all\"}]\n" \
+                    + "\t\"evp\"\n\t\"evp.h\"\n\t\"h\"\n\t\"DH2(\"\n")
+            regex = Regex(whole_words=True)
+            regex.read_keyword_list(keyword_list_path)
+            self.assertEqual(set(regex.token_match_specs["all"]), set(["evp", "h"]))
+
+            content = "evp.h evp h DH2(x) evp.hx"
+            matches = regex.search(content, "all")
+            self.assertEqual([match["matched_text"] for match in matches], \
+                ["evp.h", "evp", "h", "DH2(", "evp"])
+            for match in matches:
+                self.assertEqual(content[match["file_index_begin"]:match["file_index_end"]], \
+                    match["matched_text"])
+            self.assertTrue(regex.quick_search("x DH2(x", "all"))
+            self.assertFalse(regex.quick_search("evpx hh DH2(", "all"))
+        finally:
+            shutil.rmtree(os.path.dirname(keyword_list_path))
+
+    def test_trie_pattern(self):
+        keyword_list_path = os.path.join(tempfile.mkdtemp(), "trie_list.conf")
+        try:
+            with open(keyword_list_path, "w") as keyword_list:
+                keyword_list.write("[keyword_list_version]\n\t1\n\n" \
+                    + "[{\"evidence_type\": \"keyword\", \"language\": \"all\"}]\n" \
+                    + "".join("\t\"" + keyword + "\"\n" for keyword in ["crypt", \
+                    "cryptEncrypt\\b", "\\bcrypto", "\\b.h", "x\\b.y", "x\\by", "des", \
+                    "dex", "aes\\b", "\\bae"]))
+            content = "crypto cryptEncrypts xcrypto a.h x.y xy des dex aes aesx xae ae\n" \
+                + "cryptEncrypt desdex cryptcrypto"
+            for ignore_case in [True, False]:
+                regex = Regex(ignore_case=ignore_case)
+                regex.read_keyword_list(keyword_list_path)
+                flags = re.IGNORECASE if ignore_case else 0
+                alternation = re.compile("|".join(keyword_re for _, keyword_re \
+                    in regex.keywords["all"]), flags=flags)
+                expected = [(match.start(), match.group()) for match \
+                    in alternation.finditer(content)]
+                found = [(match["file_index_begin"], match["matched_text"]) for match \
+                    in regex.search(content, "all")]
+                self.assertEqual(found, expected)
+                self.assertTrue(all(match["evidence_type"] == "keyword" for match in \
+                    regex.search(content, "all")))
+        finally:
+            shutil.rmtree(os.path.dirname(keyword_list_path))
+
+    def test_lower_case_text_search(self):
+        keyword_list_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), \
+            "test_keyword_list.conf")
+        regex = Regex(ignore_case=True)
+        regex.read_keyword_list(keyword_list_path)
+        self.assertIsNotNone(regex.lower_pattern("all"))
+
+        # ignoring case matches the long s and the dotless i to "s" and "i", and lower-casing the
+        # dotted capital I makes the content longer, so those contents are not lower-cased
+        for content in ["LOREM Ipsum DOLOR sit", "\u017fit lorem", "S\u0131t lorem", \
+            "\u0130 lorem SIT", "\u00e9t\u00e9 Lorem"]:
+            expected = [(match.start(), match.group()) for match \
+                in regex.pattern("all").finditer(content)]
+            self.assertEqual([(match["file_index_begin"], match["matched_text"]) for match \
+                in regex.search(content, "all")], expected)
+            self.assertEqual(regex.quick_search(content, "all"), bool(expected))
+
+    def test_line_text_of_files(self):
+        current_directory = os.path.dirname(os.path.abspath(__file__))
+        packages = ["testpkg1", "testpkg2", "testpkg3"]
+        file_lines = {}
+        for package in packages:
+            package_path = os.path.join(current_directory, package)
+            for file_name in os.listdir(package_path):
+                file_path = os.path.join(package_path, file_name)
+                with open(file_path, encoding="utf-8") as test_file:
+                    file_lines[self.sha1(file_path)] = test_file.read().split("\n")
+
+        for pipeline in [False, True]:
+            result = self.scan_package(packages, {"methods": ["keyword", "api"], \
+                "pipeline": pipeline})
+            hit_files = 0
+            for package in packages:
+                for file_sha1, evidence in result[package]["crypto_evidence"].items():
+                    lines = file_lines[file_sha1]
+                    hit_files += 1
+                    for hit in evidence["hits"]:
+                        line_number = hit["line_number"]
+                        self.assertEqual(hit["line_text"], lines[line_number - 1])
+                        self.assertEqual(hit["line_text"][hit["line_index_begin"]: \
+                            hit["line_index_end"]], hit["matched_text"])
+                        for offset in [-3, -2, -1, 1, 2, 3]:
+                            field = "line_text_" + ("before_" if offset < 0 else "after_") \
+                                + str(abs(offset))
+                            expected = ""
+                            if 0 < line_number + offset <= len(lines):
+                                expected = lines[line_number + offset - 1]
+                            self.assertEqual(hit[field], expected)
+            self.assertTrue(hit_files > 2)
+
+    def test_union_pattern(self):
+        current_directory = os.path.dirname(os.path.abspath(__file__))
+        methods_directory = os.path.join(os.path.dirname(current_directory), "cryptodetector", \
+            "methods")
+        contents = []
+        for package in ["testpkg1", "testpkg2", "testpkg3", "testpkg4"]:
+            package_path = os.path.join(current_directory, package)
+            for file_name in sorted(os.listdir(package_path)):
+                with open(os.path.join(package_path, file_name), encoding="utf-8") as test_file:
+                    contents.append(test_file.read())
+
+        for keyword_list_path, regex_options in [
+                (os.path.join(current_directory, "test_keyword_list.conf"), {}),
+                (os.path.join(methods_directory, "keyword", "keyword_list.txt"), {}),
+                (os.path.join(methods_directory, "api", "api_definitions.txt"), \
+                    {"whole_words": True})]:
+            for ignore_case in [True, False]:
+                regex = Regex(ignore_case=ignore_case, **regex_options)
+                regex.read_keyword_list(keyword_list_path)
+                for language in ["all", "c"]:
+                    keywords = [keyword for keyword, _ in regex.keywords[language]]
+                    for content in contents + [" ".join(keywords) + "\n" + "_".join(keywords) \
+                        + "\n" + "".join(keywords).upper()]:
+
+                        # the matches of the keywords found in the content, line by line
+                        searched_content = content.lower() if ignore_case else content
+                        alternation = "|".join("(?:" + keyword_re + ")" for keyword, keyword_re \
+                            in regex.keywords[language] if keyword in searched_content)
+                        expected = []
+                        line_begin = 0
+                        for line in content.split("\n"):
+                            if alternation:
+                                for match in re.finditer(alternation, line, flags=regex.flags):
+                                    expected.append((line_begin + match.start(), \
+                                        line_begin + match.end(), match.group(), \
+                                        regex.match_specs[match.group().lower()]["evidence_type"]))
+                            line_begin += len(line) + 1
+
+                        found = [(match["file_index_begin"], match["file_index_end"], \
+                            match["matched_text"], match["evidence_type"]) for match \
+                            in regex.search(content, language)]
+                        self.assertEqual(found, expected)
+
+    def test_hit(self):
+        hit = Hit(matched_text="aes", file_index_begin=4, file_index_end=7, \
+            evidence_type="algorithm", line_number=1, vendor="x")
+        self.assertEqual(hit["matched_text"], "aes")
+        self.assertEqual(hit["vendor"], "x")
+        self.assertEqual(hit["comments"], "")
+        self.assertFalse("line_text" in hit)
+        self.assertIsNone(hit.get("line_text"))
+
+        crypto_output = CryptoOutput()
+        crypto_output.set_package_name("package")
+        crypto_output.add_hit("file", "sha1", Language.C, hit, \
+            line_index=LineIndex("int aes;\nint b;\n"))
+        data = json.loads(CryptoOutput.to_json(crypto_output.get_crypto_data()))
+        written_hit = data["crypto_evidence"]["sha1"]["hits"][0]
+        self.assertEqual(written_hit, hit)
+        self.assertEqual(written_hit["line_text"], "int aes;")
+        self.assertEqual(written_hit["line_text_after_1"], "int b;")
+        self.assertEqual(written_hit["vendor"], "x")
+
+        detector = CryptoDetector(Options()._get_options(), skip_output=True)
+        self.assertIs(detector.validate_match_fields("test", hit), hit)
+        self.assertEqual(detector.validate_match_fields("test", {"matched_text": "aes", \
+            "file_index_begin": 4, "file_index_end": 7, "evidence_type": "algorithm", \
+            "detection_method": "test"})["line_number"], "")
+        with self.assertRaises(InvalidMethodException):
+            detector.validate_match_fields("test", {"matched_text": "aes"})
+
+        # the scan result has plain dicts, which serialize without CryptoOutput.to_json
+        result = self.scan_package(["testpkg1"], {"methods": ["keyword", "api"]})
+        hits = [hit for evidence in result["testpkg1"]["crypto_evidence"].values() \
+            for hit in evidence["hits"]]
+        self.assertTrue(hits)
+        self.assertTrue(all(type(hit) is dict for hit in hits))
+        self.assertEqual(json.loads(json.dumps(result))["testpkg1"], result["testpkg1"])
+
+    def test_jobs(self):
+        packages = ["testpkg1", "testpkg2", "testpkg3", "testpkg4"]
+        for extra_options in [{}, {"quick": True}, {"stop_after": 1}]:
+            result = self.scan_package(packages, extra_options)
+            for jobs_option in ["jobs", "package_jobs"]:
+                parallel_options = dict(extra_options)
+                parallel_options[jobs_option] = 2
+                self.assertEqual(self.scan_package(packages, parallel_options), result)
+
+        # every package matching a wild-card address is scanned on its own
+        result = self.scan_package(["testpkg[12]"], {"package_jobs": 2})
+        self.assertEqual(result, self.scan_package(["testpkg1", "testpkg2"]))
+
+    def test_pipeline(self):
+        packages = ["testpkg1", "testpkg2", "testpkg3", "testpkg4", "extract_test"]
+        for extra_options in [{}, {"quick": True}, {"stop_after": 1}]:
+            self.assert_same_result(packages, {"pipeline": True}, extra_options)
+
+    def test_pipeline_queue(self):
+        # an item larger than the queue still gets through an empty queue, but then fills it
+        queue = PipelineQueue(max_items=4, max_bytes=10)
+        self.assertTrue(queue.put("big", 20))
+        self.assertEqual(queue.get(), "big")
+        self.assertTrue(queue.put("small", 5))
+        self.assertTrue(queue.put("small", 5))
+        self.assertEqual(queue.stats()["max_depth"], 2)
+        self.assertEqual(queue.stats()["max_bytes"], 20)
+        queue.close()
+        self.assertFalse(queue.put("small", 5))
+        self.assertIs(queue.get(), Pipeline.END)
+
+    def test_pipeline_stages(self):
+        pipeline = Pipeline(range(100), [("double", lambda n: 2 * n, None), \
+            ("add", lambda n: n + 1, None)], max_items=2)
+        self.assertEqual(list(pipeline), [2 * n + 1 for n in range(100)])
+        pipeline.close()
+
+    def test_pipeline_exceptions(self):
+        pipeline = Pipeline(range(10), [("invert", lambda n: 1 / (n - 5), None)])
+        with self.assertRaises(ZeroDivisionError):
+            list(pipeline)
+
+        # and so do the exceptions of the size functions, instead of stopping their stage silently
+        pipeline = Pipeline(range(10), [("identity", lambda n: n, len), \
+            ("double", lambda n: 2 * n, None)])
+        with self.assertRaises(TypeError):
+            list(pipeline)
+
+    def test_stream_chunk_size(self):
+        packages = ["testpkg1", "testpkg2", "testpkg3", "testpkg4", "extract_test"]
+        for keyword_ignore_case in [True, False]:
+            for extra_options in [{}, {"quick": True}, {"stop_after": 1}, \
+                {"methods": ["keyword", "api"]}]:
+                self.assert_same_result(packages, {"stream_chunk_size": 1}, extra_options, \
+                    keyword_ignore_case)
+
+    def test_stream_long_lines(self):
+        # a minified file is searched a part of its lines at a time
+        line = b"lorem ipsum dolor sit amet, " * 5000
+        package = self.make_package({"minified.js": line + b"\n" + line + b"\nsit\n"})
+        with mock.patch.object(CryptoDetector, "search_content", autospec=True, \
+            side_effect=CryptoDetector.search_content) as search_content:
+            result = self.scan_package([package], {"methods": ["keyword"], \
+                "stream_chunk_size": 1})
+        self.assertTrue(max(len(call[0][1]) for call in search_content.call_args_list) \
+            < 4 * 1024)
+
+        # the same hits, but with the line text clamped to the part of the line around them
+        fields = ["file_index_begin", "file_index_end", "matched_text", "line_number", \
+            "line_index_begin", "line_index_end"]
+        hits = lambda result: [[hit[field] for field in fields] for evidence \
+            in result[package]["crypto_evidence"].values() for hit in evidence["hits"]]
+        self.assertEqual(hits(result), hits(self.scan_package([package], \
+            {"methods": ["keyword"]})))
+        self.assertEqual(len(hits(result)), 4 * 5000 * 2 + 1)
+        self.assertTrue(all(len(hit["line_text"]) < 4 * 1024 for evidence \
+            in result[package]["crypto_evidence"].values() for hit in evidence["hits"]))
+
+    def test_mmap_threshold(self):
+        packages = ["testpkg1", "testpkg2", "testpkg3", "testpkg4", "extract_test"]
+        for keyword_ignore_case in [True, False]:
+            for extra_options in [{}, {"quick": True}, {"methods": ["keyword", "api"]}]:
+                self.assert_same_result(packages, {"mmap_threshold": 1}, extra_options, \
+                    keyword_ignore_case)
+
+    def test_mmap_ascii_text(self):
+        options = Options()._get_options()
+        options["mmap_threshold"] = 1
+        crypto_detector = CryptoDetector(options, skip_output=True)
+        file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "testpkg1", \
+            "file.cpp")
+        content, language, sha1, encoding = crypto_detector.read_file(file_path)
+        self.addCleanup(content.close)
+        self.assertEqual(sha1, self.sha1(file_path))
+        self.assertNotIsInstance(content, str)
+        self.assertEqual(str(content[:], "ascii"), crypto_detector.read_text_file(file_path))
+
+    def test_mmap_carriage_returns(self):
+        # text files with carriage returns are not mapped
+        options = Options()._get_options()
+        options["mmap_threshold"] = 1
+        package = self.make_package({"crlf.c": b"AES\r\n" * 1024})
+        file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), package, "crlf.c")
+        content, language, sha1, encoding = CryptoDetector(options, \
+            skip_output=True).read_file(file_path)
+        self.assertEqual(content, "AES\n" * 1024)
+        self.assertEqual(sha1, hashlib.sha1(b"AES\r\n" * 1024).hexdigest())
+
+    def duplicate_packages(self):
+        file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "testpkg1", "file1")
+        with open(file_path, "rb") as test_file:
+            content = test_file.read()
+        return [self.make_package({"file1": content, "copy_of_file1": content}) \
+            for _ in range(2)]
+
+    def test_duplicate_contents(self):
+        packages = self.duplicate_packages()
+        result = self.scan_package(packages, {"methods": ["keyword"]})
+        for package in packages:
+            evidence = result[package]["crypto_evidence"]
+            self.assertEqual(len(evidence), 1)
+            self.assertEqual(len(list(evidence.values())[0]["file_paths"]), 2)
+            self.assertEqual(self.count_matches(result, package, "file1", \
+                "keyword_boundary_all"), 40)
+
+    def test_duplicate_contents_in_parallel(self):
+        packages = self.duplicate_packages()
+        for extra_options in [{"jobs": 2}, {"pipeline": True}]:
+            self.assert_same_result(packages, extra_options, {"methods": ["keyword"]})
+
+    def test_duplicate_contents_hits_copied(self):
+        package = self.duplicate_packages()[0]
+        package_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), package)
+        crypto_detector = self.make_detector([package], {"methods": ["keyword"]})
+        hits = []
+        for file_name in ["file1", "copy_of_file1"]:
+            file_path = os.path.join(package_path, file_name)
+            file_result = crypto_detector.search_file(crypto_detector.load_file( \
+                {"display_path": file_path, "physical_path": file_path}))
+            hits.append(file_result["hits"])
+        self.assertTrue(hits[0])
+        self.assertEqual(hits[0], hits[1])
+        self.assertTrue(all(hit is not copied_hit for hit, copied_hit in zip(*hits)))
+
+    def test_search_duplicate_contents(self):
+        packages = self.duplicate_packages()
+        result = self.scan_package(packages, {"methods": ["keyword"], \
+            "search_duplicate_contents": True})
+        for package in packages:
+            self.assertEqual(self.count_matches(result, package, "file1", \
+                "keyword_boundary_all"), 80)
+
+    def test_scanned_contents_limit(self):
+        # only the most recently searched contents are remembered, which does not change the
+        # output, even when the hits of a content are forgotten between two of its files
+        packages = self.duplicate_packages()
+        packages.insert(1, "testpkg1")
+        result = self.scan_package(packages, {"methods": ["keyword"]})
+        with mock.patch.object(CryptoDetector, "SCANNED_CONTENTS_LIMIT", 1):
+            self.assertEqual(self.scan_package(packages, {"methods": ["keyword"]}), result)
+            crypto_detector = self.make_detector(packages, {"methods": ["keyword"]})
+            crypto_detector.scan()
+        self.assertEqual(len(crypto_detector.scanned_contents), 1)
+
+    def test_raw_content_sha1(self):
+        # a Latin-1 file with carriage returns, one of them at the end of a streamed chunk
+        raw_content = b"#" * 1023 + b"\r\n" + b"caf\xe9 sit\r\n" * 512
+        package = self.make_package({"latin1.c": raw_content})
+        result = self.scan_package([package], {"methods": ["keyword"]})
+        self.assertEqual(list(result[package]["crypto_evidence"]), \
+            [hashlib.sha1(raw_content).hexdigest()])
+        self.assertEqual(self.count_matches(result, package, "latin1.c", \
+            "keyword_boundary_all"), 512)
+        self.assert_same_result([package], {"stream_chunk_size": 1}, {"methods": ["keyword"]})
+
+    ENCODED_TEXT = "dolor sit amet\n" * 100
+
+    ENCODED_FILES = {
+        "utf16.c": ("utf-16", codecs.encode(ENCODED_TEXT, "utf-16")),
+        "utf16le.c": ("utf-16-le", codecs.encode(ENCODED_TEXT, "utf-16-le")),
+        "utf32be.c": ("utf-32-be", codecs.encode(ENCODED_TEXT, "utf-32-be")),
+        "utf32.txt": ("utf-32", codecs.encode(ENCODED_TEXT, "utf-32")),
+        "latin1.c": ("utf-8", codecs.encode(ENCODED_TEXT, "latin-1")),
+        "latin1_e.c": ("latin-1", codecs.encode("\xe9" + ENCODED_TEXT, "latin-1"))
+    }
+
+    def test_text_encodings(self):
+        package = self.make_package({file_name: encoded_file[1] for file_name, encoded_file \
+            in self.ENCODED_FILES.items()})
+        crypto_detector = CryptoDetector(Options()._get_options(), skip_output=True)
+        for file_name, encoded_file in self.ENCODED_FILES.items():
+            content, language, sha1, encoding = crypto_detector.read_file(os.path.join( \
+                os.path.dirname(os.path.abspath(__file__)), package, file_name))
+            self.assertEqual(encoding, encoded_file[0])
+            if not isinstance(content, str):
+                content = str(content, "ascii")
+            self.assertEqual(content.lstrip("\xe9"), self.ENCODED_TEXT)
+
+    def test_scan_text_encodings(self):
+        package = self.make_package({file_name: encoded_file[1] for file_name, encoded_file \
+            in self.ENCODED_FILES.items()})
+        result = self.scan_package([package], {"methods": ["keyword"]})
+        for file_name in self.ENCODED_FILES:
+            self.assertEqual(self.count_matches(result, package, file_name, \
+                "keyword_boundary_all"), 100)
+        for extra_options in [{"stream_chunk_size": 1}, {"mmap_threshold": 1}]:
+            self.assert_same_result([package], extra_options, {"methods": ["keyword"]})
+
+    def test_text_check_size(self):
+        package = self.make_package({"blob": b"sit\x00\x01\xff\n" * 1024, \
+            "late_blob": b"sit \xe9\n" + b"text\n" * 16000 + b"\x00\x01\x02\n"})
+        with mock.patch.object(CryptoDetector, "decode_text", \
+            side_effect=CryptoDetector.decode_text) as decode_text:
+            result = self.scan_package([package], {"methods": ["keyword"]})
+
+        # binary files are not decoded, and only the first bytes are checked
+        self.assertEqual(decode_text.call_count, 1)
+        self.assertEqual(list(result[package]["crypto_evidence"]), [self.sha1(os.path.join( \
+            os.path.dirname(os.path.abspath(__file__)), package, "late_blob"))])
+        for extra_options in [{"stream_chunk_size": 1}, {"mmap_threshold": 1}]:
+            self.assert_same_result([package], extra_options, {"methods": ["keyword"]})
+
+        result = self.scan_package([package], {"methods": ["keyword"], "text_check_size": 128})
+        self.assertEqual(result[package]["crypto_evidence"], {})
+
+    def test_sniff_language(self):
+        self.assertEqual(Language.guess_language("cpp"), Language.C)
+        self.assertEqual(Language.guess_language("unknown"), Language.Unknown)
+        self.assertEqual(Language.by_name("python"), Language.Python)
+        for prefix, language in [(b"#!/bin/sh\nsit\n", Language.Shell), \
+            (b"#! /usr/bin/env python3.11\n", Language.Python), \
+            (b"#!/usr/bin/perl -w\r\n", Language.Perl), \
+            (b"#!/usr/bin/ruby\n", Language.Unknown), \
+            (b"\x7fELF\x02\x01", Language.Binary), (b"sit\n", Language.Unknown)]:
+            self.assertEqual(Language.sniff_language(prefix), language)
+
+        package = self.make_package({"configure": b"#!/bin/sh\n" + b"sit\n" * 1024, \
+            "firmware": b"\x7fELF" + b"sit\n" * 1024})
+
+        # the script is source code, and the binary file is not searched by keyword
+        result = self.scan_package([package], {"methods": ["keyword"], \
+            "source_files_only": True})
+        self.assertEqual(list(result[package]["crypto_evidence"]), [self.sha1(os.path.join( \
+            os.path.dirname(os.path.abspath(__file__)), package, "configure"))])
+        self.assertEqual(self.count_matches(result, package, "configure", \
+            "keyword_boundary_all"), 1024)
+        for extra_options in [{"stream_chunk_size": 1}, {"mmap_threshold": 1}]:
+            self.assert_same_result([package], extra_options, {"methods": ["keyword"], \
+                "source_files_only": True})
+
+    def test_guess_language_by_filename(self):
+        self.assertEqual(Language.guess_language("", "Makefile"), Language.Shell)
+        self.assertEqual(Language.guess_language("ac", "configure.ac"), Language.Shell)
+        self.assertEqual(Language.guess_language("txt", "notes.txt"), Language.PlainText)
+
+        # build files without a shebang line are source code too
+        package = self.make_package({"Makefile": b"all:\n\tsit\n", "Dockerfile": b"RUN sit\n", \
+            "README": b"sit\n"})
+        result = self.scan_package([package], {"methods": ["keyword"], "source_files_only": True})
+        package_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), package)
+        self.assertEqual(set(result[package]["crypto_evidence"]), \
+            set(self.sha1(os.path.join(package_path, name)) for name in ["Makefile", "Dockerfile"]))
+
+    def test_sniff_text_with_magic_number(self):
+        # text files that begin like a magic number are searched
+        self.assertEqual(Language.sniff_language(b"BZh is our build helper"), Language.Unknown)
+        self.assertEqual(Language.sniff_language(b"BZh91AY&SY\x8a\x00"), Language.Binary)
+        package = self.make_package({ \
+            "NOTES": b"BZh is our build helper; it calls lorem and sit\n", \
+            "CHANGES": b"GIF89a notes: uses lorem\n"})
+        for extra_options in [{}, {"stream_chunk_size": 1}, {"mmap_threshold": 1}]:
+            extra_options["methods"] = ["keyword", "api"]
+            result = self.scan_package([package], extra_options)
+            for file_name in ["NOTES", "CHANGES"]:
+                self.assertIn(self.sha1(os.path.join(os.path.dirname( \
+                    os.path.abspath(__file__)), package, file_name)), \
+                    result[package]["crypto_evidence"])
+
+    def test_hash_binary_files(self):
+        with tempfile.NamedTemporaryFile(suffix=".bin", delete=False) as blob_file:
+            blob_file.write(b"\x00\x01\x02sit\n" * 300000)
+        try:
+            file_path = {"display_path": blob_file.name, "physical_path": blob_file.name}
+            options = Options()._get_options()
+            options["packages"] = [os.path.dirname(blob_file.name)]
+            crypto_detector = CryptoDetector(options, skip_output=True)
+
+            # no method searches binary files, so they are only hashed
+            file_result = crypto_detector.load_file(file_path)
+            self.assertEqual(file_result["content"], b"")
+            self.assertEqual(file_result["language"], Language.Binary)
+            self.assertEqual(file_result["sha1"], self.sha1(blob_file.name))
+            self.assertEqual(file_result["binary_bytes"], os.path.getsize(blob_file.name))
+
+            crypto_detector.searches_binary_files = lambda: True
+            file_result = crypto_detector.load_file(file_path)
+            self.assertEqual(len(file_result["content"]), os.path.getsize(blob_file.name))
+            self.assertEqual(file_result["sha1"], self.sha1(blob_file.name))
+        finally:
+            os.remove(blob_file.name)
+
+    def test_ascii_text_not_decoded(self):
+        packages = ["testpkg1", "testpkg3"]
+        with mock.patch.object(CryptoDetector, "decode_text", \
+            side_effect=AssertionError("decoded an ASCII text file")):
+            result = self.scan_package(packages)
+            quick_result = self.scan_package(packages, {"quick": True})
+
+        # the same as searching the decoded text
+        self.assertEqual(result, self.scan_package(packages, {"stream_chunk_size": 1}))
+        self.assertEqual(quick_result, self.scan_package(packages, {"quick": True, \
+            "stream_chunk_size": 1}))
+
+        crypto_detector = CryptoDetector(Options()._get_options(), skip_output=True)
+        current_directory = os.path.dirname(os.path.abspath(__file__))
+        content, language, sha1, encoding = crypto_detector.read_file( \
+            os.path.join(current_directory, "testpkg1", "file.cpp"))
+        self.assertIsInstance(content, bytes)
+        self.assertEqual(language, Language.C)
+        self.assertTrue(CryptoDetector.is_ascii_text(b"int aes;\n\tx\x1b\x7f"))
+        self.assertFalse(CryptoDetector.is_ascii_text(b"caf\xc3\xa9\n"))
+        self.assertFalse(CryptoDetector.is_ascii_text(b"int aes;\r\n"))
+        self.assertFalse(CryptoDetector.is_ascii_text("aes".encode("utf-16")))
+
+    def test_lazy_file_list(self):
+        current_directory = os.path.dirname(os.path.abspath(__file__))
+        package_path = os.path.join(current_directory, "extract_test")
+        file_lister = FileLister([package_path])
+        try:
+            file_list = file_lister.get_package_filelist(package_path)[0]["file_list"]
+
+            # nothing is extracted before the files are consumed
+            self.assertFalse(file_lister.tmp_directories)
+            first_file = next(file_list)
+            display_paths = [first_file["display_path"]] \
+                + [file_path["display_path"] for file_path in file_list]
+            self.assertEqual(display_paths, [file_path["display_path"] for file_path \
+                in file_lister.get_directory_filelist(package_path, "", "")])
+        finally:
+            file_lister.cleanup_tmp_folder()